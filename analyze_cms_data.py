@@ -1,19 +1,19 @@
 import pandas as pd
 import numpy as np
-import json
+import orjson
 from datetime import datetime, timedelta
 from typing import Dict, List, Any
 import random
 import os
 import zipfile
 import sys
-import math
+
+from utils.json_cache import load_json_cached
 
 def load_real_insights():
     """Load real insights from Medicare data analysis."""
     try:
-        with open('real_insights.json', 'r') as f:
-            return json.load(f)
+        return load_json_cached('real_insights.json')
     except FileNotFoundError:
         print("real_insights.json not found, using sample data", file=sys.stderr)
         return None
@@ -69,12 +69,8 @@ def identify_high_risk_providers_from_real_data(real_insights):
 def safe(val, default=None):
     if val is None:
         return default
-    try:
-        if isinstance(val, float) and math.isnan(val):
-            return default
-    except Exception:
-        pass
-    if pd.isna(val):
+    # NaN is the only value not equal to itself
+    if isinstance(val, float) and val != val:
         return default
     return val
 
@@ -94,17 +90,25 @@ def main():
             
             # Create referral patterns from market analysis
             market_analysis = real_insights.get('marketAnalysis', [])
-            referral_patterns = []
+            markets = pd.DataFrame(
+                market_analysis[:50],  # Top 50 markets
+                columns=['zipCode', 'topProvider', 'specialty', 'providerCount', 'marketShare']
+            ).fillna({
+                'zipCode': 'Unknown',
+                'topProvider': 'Unknown',
+                'specialty': 'Unknown',
+                'providerCount': 1,
+                'marketShare': 0
+            })
+            concentrated_markets = markets[markets['marketShare'] > 80]  # High concentration markets
             
-            for market in market_analysis[:50]:  # Top 50 markets
-                if market.get('marketShare', 0) > 80:  # High concentration markets
-                    referral_patterns.append({
-                        'fromProvider': f"Market {market.get('zipCode', 'Unknown')}",
-                        'toProvider': market.get('topProvider', 'Unknown'),
-                        'organization': market.get('specialty', 'Unknown'),
-                        'referralCount': int(market.get('providerCount', 1)),
-                        'leakageRate': market.get('marketShare', 0) / 100
-                    })
+            referral_patterns = pd.DataFrame({
+                'fromProvider': 'Market ' + concentrated_markets['zipCode'].astype(str),
+                'toProvider': concentrated_markets['topProvider'],
+                'organization': concentrated_markets['specialty'],
+                'referralCount': concentrated_markets['providerCount'].astype(int),
+                'leakageRate': concentrated_markets['marketShare'] / 100
+            }).to_dict(orient='records')
             
             # Create insights for ML predictions
             ml_insights = []
@@ -181,8 +185,8 @@ def main():
         }
 
         # Write to JSON file
-        with open('cms_analysis_results.json', 'w') as f:
-            json.dump(output, f, indent=2, default=str)
+        with open('cms_analysis_results.json', 'wb') as f:
+            f.write(orjson.dumps(output, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_INDENT_2))
 
         print("Analysis complete! Results saved to cms_analysis_results.json", file=sys.stderr)
         return output
@@ -1,15 +1,26 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Dict, Any
 import numpy as np
 from datetime import datetime
 import logging
 import asyncio
-from sklearn.ensemble import RandomForestRegressor, IsolationForest
-import pickle
+from concurrent.futures import ThreadPoolExecutor
+import joblib
 import os
-import json
+import hashlib
+from importlib.metadata import version
+import ijson
+
+# ONNX Runtime is optional; without it the sklearn forests are used directly
+try:
+    import onnxruntime as ort
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+except ImportError:
+    ort = None
 
 # Import our file handler
 from config import config
@@ -35,32 +46,82 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Synthetic fallback models are fitted once and cached here
+FALLBACK_MODELS_DIR = os.path.join(os.path.dirname(__file__), 'models')
+FALLBACK_N_SAMPLES = 1000
+FALLBACK_SEED = 42
+
+# Maximum relative MAE allowed between a compiled model and the original
+COMPILED_MODEL_TOLERANCE = 1e-3
+
+# Thread pool for blocking model inference
+inference_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+# Random generator for synthetic fallback features
+rng = np.random.default_rng()
+
 # ML models - will be loaded from file or initialized with mock data
 leakage_model = None
 revenue_model = None
 anomaly_detector = None
 
-# Load real_insights.json and build lookup dicts
+# Load real_insights.json and build lookup tables
 REAL_INSIGHTS_PATH = os.path.join(os.path.dirname(__file__), 'outputs', 'real_insights.json')
-real_insights = None
-provider_lookup_by_npi = {}
-provider_lookup_by_zip_specialty = {}
+# Only a handful of raw entries are kept, for the debug endpoint
+DEBUG_SAMPLE_SIZE = 5
+sample_providers_by_npi = {}
+
+# Specialties scored with the lower specialty_risk feature value
+HIGH_RISK_SPECIALTY_NAMES = frozenset({'Cardiology', 'Oncology', 'Orthopedics'})
+HIGH_RISK_SPECIALTY_CODES = frozenset({'207RC0000X', '207T00000X'})
+
+def _zip_numeric(zip_code) -> float:
+    """Map a ZIP code to the geographic feature in [0, 1)"""
+    zip_str = str(zip_code) if zip_code else ''
+    return int(zip_str) % 1000 / 1000.0 if zip_str.isdigit() else 0.5
+
+def _entry_features(entry: Dict[str, Any]) -> List[float]:
+    """Map a marketAnalysis entry to the 5 ML features"""
+    specialty = entry.get('specialty', '')
+    return [
+        float(entry.get('marketSharePercentage', 0)) / 100.0,  # Feature 1: Historical leakage rate
+        float(entry.get('providerCount', 1)) / 100.0,           # Feature 2: Network density
+        float(entry.get('topProviderRevenue', 0)) / 10000.0,    # Feature 3: Referral velocity
+        _zip_numeric(entry.get('zipCode')),                     # Feature 4: Geographic factor
+        0.3 if specialty in HIGH_RISK_SPECIALTY_NAMES else 0.5  # Feature 5: Specialty risk
+    ]
+
+# Struct-of-arrays feature table: one row per marketAnalysis entry plus a
+# trailing fallback row for referrals with no real data
+npi_to_row = {}
+zip_specialty_to_row = {}
+feature_rows = []
 
 try:
-    with open(REAL_INSIGHTS_PATH, 'r') as f:
-        real_insights = json.load(f)
-        for entry in real_insights.get('marketAnalysis', []):
+    # Stream marketAnalysis entries so the full document is never held in memory
+    with open(REAL_INSIGHTS_PATH, 'rb') as f:
+        for entry in ijson.items(f, 'marketAnalysis.item', use_float=True):
             npi = entry.get('topProviderNPI')
             zip_code = entry.get('zipCode')
             specialty = entry.get('specialty')
+            if not npi and not (zip_code and specialty):
+                continue
+            row = len(feature_rows)
+            feature_rows.append(_entry_features(entry))
             if npi:
-                provider_lookup_by_npi[npi] = entry
+                npi_to_row[npi] = row
+                if npi in sample_providers_by_npi or len(sample_providers_by_npi) < DEBUG_SAMPLE_SIZE:
+                    sample_providers_by_npi[npi] = entry
             if zip_code and specialty:
-                provider_lookup_by_zip_specialty[(zip_code, specialty)] = entry
-    logger.info(f"Loaded real_insights.json with {len(provider_lookup_by_npi)} providers by NPI.")
+                zip_specialty_to_row[(zip_code, specialty)] = row
+    logger.info(f"Loaded real_insights.json with {len(npi_to_row)} providers by NPI.")
 except Exception as e:
     logger.warning(f"Could not load real_insights.json: {e}")
 
+FALLBACK_ROW = len(feature_rows)
+provider_features = np.array(feature_rows + [[0.0, 0.0, 0.0, 0.5, 0.5]], dtype=np.float32)
+del feature_rows
+
 # Initialize models with mock data or load from file
 def initialize_models():
     """Initialize ML models with synthetic training data or load from file"""
@@ -73,52 +134,138 @@ def initialize_models():
     if file_handler.file_exists(model_path):
         try:
             logger.info(f"Loading model from {model_path}")
-            with file_handler.open_binary(model_path) as f:
-                loaded_model = pickle.load(f)
+            loaded_model = load_model_file(model_path)
             # For now, we'll use the loaded model as our leakage model
             leakage_model = loaded_model
             logger.info("Model loaded successfully from file")
         except Exception as e:
-            logger.warn(f"Failed to load model from file: {e}")
+            logger.warning(f"Failed to load model from file: {e}")
             leakage_model = None
     
     # If no model loaded, create mock models
     if leakage_model is None:
         logger.info("Creating mock models with synthetic data...")
-leakage_model = RandomForestRegressor(n_estimators=100, random_state=42)
-revenue_model = RandomForestRegressor(n_estimators=100, random_state=42)
-anomaly_detector = IsolationForest(contamination=0.1, random_state=42)
-
-        # Generate synthetic training data (5 features to match trained model)
-    np.random.seed(42)
-    n_samples = 1000
-        X = np.random.rand(n_samples, 5)
+        fallback = load_or_fit_fallback_models(include_leakage=True)
+        leakage_model = fallback['leakage']
+        revenue_model = fallback['revenue']
+        anomaly_detector = fallback['anomaly']
+        
+        X_check = rng.random((200, 5))
+        leakage_model = compile_for_inference(leakage_model, X_check)
+        revenue_model = compile_for_inference(revenue_model, X_check)
+        
+        logger.info("Mock models initialized successfully")
+    else:
+        # If we loaded a model, create the other models as mock
+        fallback = load_or_fit_fallback_models(include_leakage=False)
+        revenue_model = fallback['revenue']
+        anomaly_detector = fallback['anomaly']
+        
+        revenue_model = compile_for_inference(revenue_model, rng.random((200, 5)))
+
+def _fallback_models_path(include_leakage: bool) -> str:
+    """Cache file for the synthetic fallback models, named by their training setup"""
+    # The sklearn version is part of the setup so an upgrade refits instead of
+    # unpickling forests built by the old release; read from package metadata
+    # to keep sklearn itself off the startup path
+    setup = (
+        f"leakage={include_leakage}:n_samples={FALLBACK_N_SAMPLES}:seed={FALLBACK_SEED}:features=5"
+        f":sklearn={version('scikit-learn')}"
+    )
+    digest = hashlib.sha256(setup.encode()).hexdigest()[:16]
+    return os.path.join(FALLBACK_MODELS_DIR, f"fallback_{digest}.joblib")
+
+def load_or_fit_fallback_models(include_leakage: bool) -> Dict[str, Any]:
+    """Load the synthetic fallback models from disk, fitting and caching them on first run"""
+    path = _fallback_models_path(include_leakage)
+    if os.path.exists(path):
+        try:
+            models = joblib.load(path, mmap_mode='r')
+            logger.info(f"Loaded cached fallback models from {path}")
+            return models
+        except Exception as e:
+            logger.warning(f"Failed to load cached fallback models from {path}: {e}")
+    
+    # sklearn is only needed when fitting, so keep it off the cached startup path
+    from sklearn.ensemble import RandomForestRegressor, IsolationForest
     
-    # Target variables
-    leakage_prob = 0.3 + 0.4 * X[:, 0] + 0.2 * X[:, 1] + 0.1 * X[:, 2] + np.random.normal(0, 0.1, n_samples)
-    leakage_prob = np.clip(leakage_prob, 0, 1)
+    # Generate synthetic training data (5 features to match trained model)
+    fit_rng = np.random.default_rng(FALLBACK_SEED)
+    n_samples = FALLBACK_N_SAMPLES
+    X = fit_rng.random((n_samples, 5))
+    models = {}
     
-    revenue_loss = 5000 + 10000 * leakage_prob + np.random.normal(0, 1000, n_samples)
-    revenue_loss = np.maximum(revenue_loss, 0)
+    if include_leakage:
+        # Target variables
+        leakage_prob = 0.3 + 0.4 * X[:, 0] + 0.2 * X[:, 1] + 0.1 * X[:, 2] + fit_rng.normal(0, 0.1, n_samples)
+        leakage_prob = np.clip(leakage_prob, 0, 1)
+        
+        revenue_loss = 5000 + 10000 * leakage_prob + fit_rng.normal(0, 1000, n_samples)
+        revenue_loss = np.maximum(revenue_loss, 0)
+        
+        models['leakage'] = RandomForestRegressor(n_estimators=100, random_state=42).fit(X, leakage_prob)
+    else:
+        revenue_loss = fit_rng.exponential(5000, n_samples)
     
     # Train models
-    leakage_model.fit(X, leakage_prob)
-    revenue_model.fit(X, revenue_loss)
-    anomaly_detector.fit(X)
+    models['revenue'] = RandomForestRegressor(n_estimators=100, random_state=42).fit(X, revenue_loss)
+    models['anomaly'] = IsolationForest(contamination=0.1, random_state=42).fit(X)
     
-        logger.info("Mock models initialized successfully")
-    else:
-        # If we loaded a model, create the other models as mock
-        revenue_model = RandomForestRegressor(n_estimators=100, random_state=42)
-        anomaly_detector = IsolationForest(contamination=0.1, random_state=42)
-        
-        # Train the mock models with synthetic data (5 features to match trained model)
-        np.random.seed(42)
-        n_samples = 1000
-        X = np.random.rand(n_samples, 5)
-        revenue_loss = np.random.exponential(5000, n_samples)
-        revenue_model.fit(X, revenue_loss)
-        anomaly_detector.fit(X)
+    try:
+        os.makedirs(FALLBACK_MODELS_DIR, exist_ok=True)
+        joblib.dump(models, path, compress=0)
+        logger.info(f"Cached fallback models to {path}")
+    except Exception as e:
+        logger.warning(f"Could not cache fallback models to {path}: {e}")
+    
+    return models
+
+class OnnxRegressor:
+    """sklearn-style regressor whose predict() runs on ONNX Runtime"""
+    
+    def __init__(self, model, n_features: int = 5):
+        onx = convert_sklearn(model, initial_types=[('X', FloatTensorType([None, n_features]))])
+        self.session = ort.InferenceSession(onx.SerializeToString(), providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+    
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return self.session.run(None, {self.input_name: X})[0].ravel()
+
+def compile_for_inference(model, X_check: np.ndarray):
+    """Compile a fitted regressor to ONNX when onnxruntime is installed
+    
+    The ONNX tree ensemble stores float32 thresholds (half the size of
+    sklearn's float64 nodes), so the compiled model is checked against
+    the original on X_check and discarded if predictions drift too far.
+    """
+    if ort is None:
+        return model
+    try:
+        compiled = OnnxRegressor(model)
+    except Exception as e:
+        logger.warning(f"Could not compile {type(model).__name__} to ONNX: {e}")
+        return model
+    
+    expected = model.predict(X_check)
+    drift = np.abs(compiled.predict(X_check) - expected).mean() / max(np.abs(expected).mean(), 1e-12)
+    if drift > COMPILED_MODEL_TOLERANCE:
+        logger.warning(f"ONNX {type(model).__name__} drifted by {drift:.2e} relative MAE, keeping sklearn model")
+        return model
+    
+    logger.info(f"Compiled {type(model).__name__} to ONNX (relative MAE {drift:.2e})")
+    return compiled
+
+def load_model_file(model_path: str):
+    """Load a model file, memory-mapping its arrays when saved with joblib"""
+    try:
+        # Large tree arrays are mapped read-only and shared across workers
+        return joblib.load(model_path, mmap_mode='r')
+    except Exception as e:
+        logger.warning(f"joblib could not load {model_path} ({e}), falling back to pickle")
+        import pickle
+        with file_handler.open_binary(model_path) as f:
+            return pickle.load(f)
 
 # Pydantic models
 class ReferralRequest(BaseModel):
@@ -163,73 +310,77 @@ async def root():
         "timestamp": datetime.now().isoformat()
     }
 
-@app.post("/score/batch", response_model=BatchScoringResponse)
+@app.post("/score/batch", response_class=ORJSONResponse, responses={200: {"model": BatchScoringResponse}})
 async def score_batch_referrals(request: BatchScoringRequest):
     """Score multiple referrals for leakage risk"""
     try:
         logger.info(f"Received batch scoring request with {len(request.referrals)} referrals")
         results = []
-        total_risk = 0
-        total_leakage_prob = 0
         
-        for i, referral in enumerate(request.referrals):
-            logger.info(f"Processing referral {i+1}/{len(request.referrals)}: NPI={referral.from_provider_npi}")
-            
-            # Extract features
-            features = extract_features(referral)
-            logger.info(f"Extracted features for NPI {referral.from_provider_npi}: {features}")
-            
-            # Make predictions
-            if hasattr(leakage_model, "predict_proba"):
-                leakage_prob = leakage_model.predict_proba([features])[0][1]
-            else:
-            leakage_prob = leakage_model.predict([features])[0]
-
-            revenue_loss = revenue_model.predict([features])[0]
-            anomaly_score = anomaly_detector.decision_function([features])[0]
-            
-            logger.info(f"Raw predictions for NPI {referral.from_provider_npi}: leakage_prob={leakage_prob:.4f}, revenue_loss={revenue_loss:.2f}, anomaly_score={anomaly_score:.4f}")
-            
-            # Calculate risk score
-            risk_score = calculate_risk_score(leakage_prob, revenue_loss, anomaly_score)
-            logger.info(f"Calculated risk_score for NPI {referral.from_provider_npi}: {risk_score}")
-            logger.info(f"Leakage rate: {leakage_prob}, Predicted loss: {leakage_prob * referral.estimated_charge}")
-            
-            # Generate risk factors
-            risk_factors = generate_risk_factors(features, leakage_prob)
-            
-            # Calculate confidence score
-            confidence_score = calculate_confidence_score(features)
-            
-            result = ScoringResponse(
-                provider_npi=referral.from_provider_npi,
-                provider_name=f"Provider {referral.from_provider_npi[-4:]}",
-                leakage_probability=float(leakage_prob),
-                risk_score=float(risk_score),
-                expected_revenue_loss=float(revenue_loss),
-                confidence_score=float(confidence_score),
-                risk_factors=risk_factors,
-                anomaly_score=float(anomaly_score)
+        # Extract features for the whole batch and run each model once
+        X = extract_features_batch(request.referrals)
+        
+        if len(X):
+            # Model calls block, so run them on the inference pool to keep the event loop free
+            loop = asyncio.get_running_loop()
+            leakage_probs, revenue_losses, anomaly_scores = await asyncio.gather(
+                loop.run_in_executor(inference_executor, predict_leakage, X),
+                loop.run_in_executor(inference_executor, revenue_model.predict, X),
+                loop.run_in_executor(inference_executor, anomaly_detector.decision_function, X)
             )
+        else:
+            # sklearn rejects empty input, so an empty batch skips the models
+            leakage_probs = revenue_losses = anomaly_scores = np.zeros(0)
+        
+        # Calculate risk and confidence scores for the whole batch
+        risk_scores = calculate_risk_score_vec(leakage_probs, revenue_losses, anomaly_scores)
+        confidence_scores = calculate_confidence_score_vec(X)
+        
+        # Per-referral diagnostics are only formatted when DEBUG is enabled
+        if logger.isEnabledFor(logging.DEBUG):
+            for referral, features, leakage_prob, revenue_loss, anomaly_score, risk_score in zip(
+                request.referrals, X, leakage_probs, revenue_losses, anomaly_scores, risk_scores
+            ):
+                logger.debug(f"NPI={referral.from_provider_npi}: features={features.tolist()}, leakage_prob={leakage_prob:.4f}, revenue_loss={revenue_loss:.2f}, anomaly_score={anomaly_score:.4f}, risk_score={risk_score:.4f}")
+        
+        # Convert to native Python floats in bulk rather than per field
+        rows = zip(
+            request.referrals,
+            generate_risk_factors_batch(X, leakage_probs),
+            np.asarray(leakage_probs, dtype=np.float64).tolist(),
+            np.asarray(revenue_losses, dtype=np.float64).tolist(),
+            np.asarray(anomaly_scores, dtype=np.float64).tolist(),
+            risk_scores.astype(np.float64).tolist(),
+            confidence_scores.astype(np.float64).tolist()
+        )
+        
+        for referral, risk_factors, leakage_prob, revenue_loss, anomaly_score, risk_score, confidence_score in rows:
+            # Values come from our own models, so skip per-row Pydantic validation
+            result = {
+                "provider_npi": referral.from_provider_npi,
+                "provider_name": f"Provider {referral.from_provider_npi[-4:]}",
+                "leakage_probability": leakage_prob,
+                "risk_score": risk_score,
+                "expected_revenue_loss": revenue_loss,
+                "confidence_score": confidence_score,
+                "risk_factors": risk_factors,
+                "anomaly_score": anomaly_score
+            }
             
             results.append(result)
-            total_risk += risk_score
-            total_leakage_prob += leakage_prob
-        
-        # Calculate summary statistics
-        avg_risk = total_risk / len(results) if results else 0
-        avg_leakage_prob = total_leakage_prob / len(results) if results else 0
         
+        # Calculate summary statistics from the prediction arrays
+        n = len(results)
         summary = {
-            "total_referrals": len(results),
-            "avg_risk_score": float(avg_risk),
-            "avg_leakage_probability": float(avg_leakage_prob),
-            "high_risk_count": len([r for r in results if r.risk_score > 0.7]),
-            "total_revenue_at_risk": float(sum(r.expected_revenue_loss for r in results))
+            "total_referrals": n,
+            "avg_risk_score": float(risk_scores.mean()) if n else 0.0,
+            "avg_leakage_probability": float(leakage_probs.mean()) if n else 0.0,
+            "high_risk_count": int((risk_scores > 0.7).sum()),
+            "total_revenue_at_risk": float(revenue_losses.sum())
         }
         
         logger.info(f"Batch scoring completed. Summary: {summary}")
-        return BatchScoringResponse(results=results, summary=summary)
+        return ORJSONResponse({"results": results, "summary": summary})
         
     except Exception as e:
         logger.error(f"Error scoring batch referrals: {e}")
@@ -271,7 +422,7 @@ async def test_provider(npi: str):
                 "anomaly_score": float(anomaly_score),
                 "risk_score": float(risk_score)
             },
-            "provider_found_in_data": npi in provider_lookup_by_npi
+            "provider_found_in_data": npi in npi_to_row
         }
     except Exception as e:
         logger.error(f"Error testing provider {npi}: {e}")
@@ -285,8 +436,8 @@ async def get_model_info():
         "model_type": type(leakage_model).__name__ if leakage_model else None,
         "feature_count": 5,
         "feature_names": ["historical_leakage", "network_density", "referral_velocity", "zip_numeric", "specialty_risk"],
-        "providers_in_lookup": len(provider_lookup_by_npi),
-        "real_insights_loaded": len(provider_lookup_by_npi) > 0
+        "providers_in_lookup": len(npi_to_row),
+        "real_insights_loaded": len(npi_to_row) > 0
     }
 
 @app.get("/debug/test-providers")
@@ -294,7 +445,7 @@ async def debug_test_providers():
     """Test predictions for the first 5 real providers in the lookup."""
     test_results = []
     # Get first 5 providers from real_insights
-    for npi, entry in list(provider_lookup_by_npi.items())[:5]:
+    for npi, entry in sample_providers_by_npi.items():
         # Build a test referral
         test_referral = ReferralRequest(
             from_provider_npi=npi,
@@ -328,46 +479,41 @@ async def debug_test_providers():
     return {"test_results": test_results}
 
 # Helper functions
+def predict_leakage(X: np.ndarray) -> np.ndarray:
+    """Leakage probability for each row of X"""
+    if hasattr(leakage_model, "predict_proba"):
+        return leakage_model.predict_proba(X)[:, 1]
+    return leakage_model.predict(X)
+
+def _feature_row(referral: ReferralRequest) -> int:
+    """Row of provider_features for a referral, by NPI then zip+specialty"""
+    row = npi_to_row.get(referral.from_provider_npi)
+    if row is None:
+        row = zip_specialty_to_row.get((referral.patient_zip, referral.specialty), FALLBACK_ROW)
+    return row
+
 def extract_features(referral: ReferralRequest) -> List[float]:
     """Extract features from referral data, using real data if available."""
-    # Try to find provider by NPI
-    entry = provider_lookup_by_npi.get(referral.from_provider_npi)
-    # If not found, try by zip+specialty
-    if not entry:
-        entry = provider_lookup_by_zip_specialty.get((referral.patient_zip, referral.specialty))
-    if entry:
-        # Map real fields to ML features (5 features to match trained model)
-        historical_leakage = float(entry.get('marketSharePercentage', 0)) / 100.0
-        network_density = float(entry.get('providerCount', 1)) / 100.0
-        referral_velocity = float(entry.get('topProviderRevenue', 0)) / 10000.0
-        zip_numeric = int(entry.get('zipCode', '0')) % 1000 / 1000.0 if entry.get('zipCode') else 0.5
-        specialty = entry.get('specialty', '')
-        specialty_risk = 0.3 if specialty in ['Cardiology', 'Oncology', 'Orthopedics'] else 0.5
-        
-        logger.info(f"Using REAL features for NPI {referral.from_provider_npi} (zip={referral.patient_zip}, specialty={referral.specialty})")
-        return [
-            historical_leakage,  # Feature 1: Historical leakage rate
-            network_density,     # Feature 2: Network density
-            referral_velocity,   # Feature 3: Referral velocity
-            zip_numeric,         # Feature 4: Geographic factor
-            specialty_risk       # Feature 5: Specialty risk
-        ]
-    else:
-        # Fallback to synthetic features (5 features to match trained model)
-        logger.warning(f"Using SYNTHETIC features for NPI {referral.from_provider_npi} (zip={referral.patient_zip}, specialty={referral.specialty})")
-    historical_leakage = np.random.beta(2, 5)
-    network_density = np.random.beta(3, 2)
-    referral_velocity = np.random.exponential(2)
-    zip_numeric = int(referral.patient_zip) % 1000 / 1000 if referral.patient_zip.isdigit() else 0.5
-        specialty_risk = 0.3 if referral.specialty in ['207RC0000X', '207T00000X'] else 0.5
+    return extract_features_batch([referral])[0].tolist()
+
+def extract_features_batch(referrals: List[ReferralRequest]) -> np.ndarray:
+    """Extract features for a batch of referrals as an (N, 5) float32 matrix."""
+    rows = np.fromiter((_feature_row(r) for r in referrals), dtype=np.int32, count=len(referrals))
+    X = provider_features[rows]
     
-    return [
-            historical_leakage,  # Feature 1: Historical leakage rate
-            network_density,     # Feature 2: Network density
-            referral_velocity,   # Feature 3: Referral velocity
-            zip_numeric,         # Feature 4: Geographic factor
-            specialty_risk       # Feature 5: Specialty risk
-    ]
+    # Fallback to synthetic features for referrals without real data
+    miss = np.flatnonzero(rows == FALLBACK_ROW)
+    if miss.size:
+        logger.info(f"Using SYNTHETIC features for {miss.size} of {len(referrals)} referrals")
+        X[miss, 0] = rng.beta(2, 5, miss.size)         # Feature 1: Historical leakage rate
+        X[miss, 1] = rng.beta(3, 2, miss.size)         # Feature 2: Network density
+        X[miss, 2] = rng.exponential(2, miss.size)     # Feature 3: Referral velocity
+        for i in miss:
+            referral = referrals[i]
+            X[i, 3] = _zip_numeric(referral.patient_zip)  # Feature 4: Geographic factor
+            X[i, 4] = 0.3 if referral.specialty in HIGH_RISK_SPECIALTY_CODES else 0.5  # Feature 5: Specialty risk
+    
+    return X
 
 def calculate_risk_score(leakage_prob: float, revenue_loss: float, anomaly_score: float) -> float:
     """Calculate overall risk score (0-1)"""
@@ -382,26 +528,40 @@ def calculate_risk_score(leakage_prob: float, revenue_loss: float, anomaly_score
     
     return min(max(risk_score, 0), 1)
 
-def generate_risk_factors(features: List[float], leakage_prob: float) -> List[str]:
-    """Generate risk factors based on features"""
-    risk_factors = []
-    
-    if features[0] > 0.3:
-        risk_factors.append("High historical leakage rate")
-    
-    if features[1] < 0.3:
-        risk_factors.append("Low network density")
-    
-    if features[2] > 3:
-        risk_factors.append("High referral velocity")
-    
-    if leakage_prob > 0.5:
-        risk_factors.append("Out-of-network referrals")
-    
-    if not risk_factors:
-        risk_factors.append("Moderate risk profile")
+def calculate_risk_score_vec(leakage_probs: np.ndarray, revenue_losses: np.ndarray, anomaly_scores: np.ndarray) -> np.ndarray:
+    """Vectorized calculate_risk_score over (N,) prediction arrays"""
+    risk_scores = (
+        0.4 * leakage_probs +
+        0.4 * np.minimum(revenue_losses / 50000.0, 1.0) +
+        0.2 * np.maximum(0.0, -anomaly_scores)
+    )
     
-    return risk_factors
+    return np.clip(risk_scores, 0.0, 1.0)
+
+# Risk factor labels, one per bit of the code built in generate_risk_factors_batch
+RISK_FACTOR_LABELS = (
+    "High historical leakage rate",
+    "Low network density",
+    "High referral velocity",
+    "Out-of-network referrals"
+)
+
+def _risk_factors_for_code(code: int) -> List[str]:
+    """Risk factor list for one combination of threshold flags"""
+    risk_factors = [label for bit, label in enumerate(RISK_FACTOR_LABELS) if code >> bit & 1]
+    return risk_factors or ["Moderate risk profile"]
+
+RISK_FACTOR_TABLE = [_risk_factors_for_code(code) for code in range(1 << len(RISK_FACTOR_LABELS))]
+
+def generate_risk_factors_batch(X: np.ndarray, leakage_probs: np.ndarray) -> List[List[str]]:
+    """Generate risk factors for each row of the (N, 5) feature matrix"""
+    codes = (
+        (X[:, 0] > 0.3) * 1 |
+        (X[:, 1] < 0.3) * 2 |
+        (X[:, 2] > 3) * 4 |
+        (leakage_probs > 0.5) * 8
+    )
+    return [RISK_FACTOR_TABLE[code] for code in codes.tolist()]
 
 def calculate_confidence_score(features: List[float]) -> float:
     """Calculate prediction confidence score"""
@@ -409,6 +569,10 @@ def calculate_confidence_score(features: List[float]) -> float:
     confidence = max(0.6, 1.0 - feature_variance)
     return confidence
 
+def calculate_confidence_score_vec(X: np.ndarray) -> np.ndarray:
+    """Vectorized calculate_confidence_score over an (N, 5) feature matrix"""
+    return np.maximum(0.6, 1.0 - X.var(axis=1))
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
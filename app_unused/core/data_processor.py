@@ -5,6 +5,9 @@ Handles efficient loading and processing of large CMS datasets.
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
 import logging
@@ -18,6 +21,35 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def _to_arrow_strings(series: pd.Series) -> pa.ChunkedArray:
+    """Get a string column as an Arrow array without per-row conversion."""
+    # pa.array goes through __arrow_array__ and returns the backing ChunkedArray
+    return pa.array(series.astype(pd.ArrowDtype(pa.string())))
+
+def _from_arrow(values: pa.ChunkedArray, index: pd.Index) -> pd.Series:
+    """Wrap an Arrow array as an Arrow-backed pandas Series."""
+    return pd.Series(pd.arrays.ArrowExtensionArray(values), index=index)
+
+def shrink_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Downcast numeric columns to the smallest dtype that holds their values.
+    
+    Integers become the narrowest signed or unsigned type covering their
+    min/max, and floats become float32.
+    
+    Args:
+        df: DataFrame to downcast in place
+        
+    Returns:
+        The same DataFrame, for chaining
+    """
+    for col in df.select_dtypes(include='integer').columns:
+        downcast = 'unsigned' if len(df) and df[col].min() >= 0 else 'integer'
+        df[col] = pd.to_numeric(df[col], downcast=downcast)
+    for col in df.select_dtypes(include='floating').columns:
+        df[col] = pd.to_numeric(df[col], downcast='float')
+    return df
+
 class CMSDataProcessor:
     """Handles loading and processing of CMS datasets efficiently."""
     
@@ -33,12 +65,12 @@ class CMSDataProcessor:
         self.physician_compare_df = None
         self.medicare_services_df = None
         
-    def load_nppes_data(self, chunk_size: int = 100000) -> None:
+    def load_nppes_data(self, block_size: int = 64 << 20) -> None:
         """
-        Load NPPES provider database efficiently using chunking.
+        Load NPPES provider database by streaming it through Arrow's CSV reader.
         
         Args:
-            chunk_size: Number of rows to process at once
+            block_size: Number of bytes parsed per record batch
         """
         logger.info("Loading NPPES provider database...")
         zip_path = self.data_dir / "NPPES_Data_Dissemination_June_2025.zip"
@@ -53,27 +85,32 @@ class CMSDataProcessor:
             'Provider License Number State Code_1'
         ]
         
-        # Read in chunks with only needed columns
-        chunks = []
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
             # Find the main NPI data file
             npi_file = next(f for f in zip_ref.namelist() if f.startswith('npidata_pfile_') and f.endswith('.csv'))
             
-            # Read the file in chunks
+            # Stream record batches straight from the archive with only needed columns
             with zip_ref.open(npi_file) as f:
-                for chunk in pd.read_csv(
+                reader = pa_csv.open_csv(
                     f,
-                    usecols=needed_columns,
-                    chunksize=chunk_size,
-                    dtype={
-                        'NPI': 'str',
-                        'Provider Business Practice Location Address Postal Code': 'str',
-                        'Healthcare Provider Taxonomy Code_1': 'str'
-                    }
-                ):
-                    chunks.append(chunk)
-        
-        self.nppes_df = pd.concat(chunks, ignore_index=True)
+                    read_options=pa_csv.ReadOptions(block_size=block_size, use_threads=True),
+                    convert_options=pa_csv.ConvertOptions(
+                        include_columns=needed_columns,
+                        # Empty / NA cells become null (NaN in pandas), as pd.read_csv did
+                        strings_can_be_null=True,
+                        column_types={
+                            'NPI': pa.string(),
+                            'Provider Business Practice Location Address Postal Code': pa.string(),
+                            # Low-cardinality columns are dictionary-encoded (pandas category)
+                            'Provider Business Practice Location Address State Name': pa.dictionary(pa.int32(), pa.string()),
+                            'Healthcare Provider Taxonomy Code_1': pa.dictionary(pa.int32(), pa.string()),
+                            'Provider License Number State Code_1': pa.dictionary(pa.int32(), pa.string())
+                        }
+                    )
+                )
+                table = pa.Table.from_batches(reader, schema=reader.schema)
+        
+        self.nppes_df = table.to_pandas(types_mapper=pd.ArrowDtype, self_destruct=True)
         logger.info(f"Loaded {len(self.nppes_df):,} NPPES provider records")
         
     def load_physician_compare_data(self, chunk_size: int = 100000) -> None:
@@ -95,6 +132,9 @@ class CMSDataProcessor:
             'City/Town', 'State', 'ZIP Code'
         ]
         
+        # Low-cardinality columns are stored as category codes
+        categorical_columns = ['pri_spec', 'City/Town', 'State']
+        
         chunks = []
         for chunk in pd.read_csv(
             file_path,
@@ -104,30 +144,41 @@ class CMSDataProcessor:
                 'NPI': 'str',
                 'Ind_PAC_ID': 'str',
                 'Ind_enrl_ID': 'str',
-                'ZIP Code': 'str'
+                'ZIP Code': 'str',
+                **{col: 'category' for col in categorical_columns}
             }
         ):
             chunks.append(chunk)
             
         self.physician_compare_df = pd.concat(chunks, ignore_index=True)
+        
+        # Chunks carry their own category sets, so unify them after concat
+        for col in categorical_columns:
+            self.physician_compare_df[col] = self.physician_compare_df[col].astype('category')
+        shrink_dtypes(self.physician_compare_df)
         logger.info(f"Loaded {len(self.physician_compare_df):,} Physician Compare records")
         
     def standardize_provider_names(self) -> None:
         """Standardize provider names across datasets."""
         if self.nppes_df is not None:
-            # Standardize organization names
-            self.nppes_df['Provider Organization Name (Legal Business Name)'] = (
-                self.nppes_df['Provider Organization Name (Legal Business Name)']
-                .str.upper()
-                .str.strip()
-                .str.replace(r'\s+', ' ', regex=True)
-            )
+            org_col = 'Provider Organization Name (Legal Business Name)'
+            
+            # Standardize organization names with Arrow string kernels
+            org_names = _to_arrow_strings(self.nppes_df[org_col])
+            org_names = pc.utf8_trim_whitespace(pc.utf8_upper(org_names))
+            # Collapse whitespace runs to one space without a regex engine:
+            # split on runs of whitespace, then rejoin the words with ' '
+            org_names = pc.binary_join(pc.utf8_split_whitespace(org_names), ' ')
+            self.nppes_df[org_col] = _from_arrow(org_names, self.nppes_df.index)
             
             # Combine individual provider names
-            self.nppes_df['Provider Full Name'] = (
-                self.nppes_df['Provider First Name'] + ' ' + 
-                self.nppes_df['Provider Last Name (Legal Name)']
-            ).str.upper().str.strip()
+            full_names = pc.binary_join_element_wise(
+                _to_arrow_strings(self.nppes_df['Provider First Name']),
+                _to_arrow_strings(self.nppes_df['Provider Last Name (Legal Name)']),
+                ' '
+            )
+            full_names = pc.utf8_trim_whitespace(pc.utf8_upper(full_names))
+            self.nppes_df['Provider Full Name'] = _from_arrow(full_names, self.nppes_df.index)
             
     def get_provider_affiliations(self) -> pd.DataFrame:
         """
@@ -139,13 +190,30 @@ class CMSDataProcessor:
         if self.nppes_df is None or self.physician_compare_df is None:
             raise ValueError("Must load NPPES and Physician Compare data first")
             
-        # Merge datasets on NPI
+        # Merge datasets on NPI. NPIs are 10-digit numbers, so join on sorted
+        # int64 indexes (a merge join) rather than hashing NPI strings.
+        # Rows with a blank or non-numeric NPI can't be joined and are dropped.
+        def npi_index(df):
+            # Arrow-backed input can coerce '' to NaN rather than null, so
+            # test finiteness on a plain float array
+            npi = pd.to_numeric(df['NPI'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+            valid = np.isfinite(npi)
+            dropped = len(df) - int(valid.sum())
+            if dropped:
+                logger.warning(f"Dropping {dropped} rows with a missing or invalid NPI")
+            return (
+                df[valid].assign(NPI=npi[valid].astype(np.int64))
+                .sort_values('NPI', kind='stable').set_index('NPI')
+            )
+        
         affiliations = pd.merge(
-            self.nppes_df[['NPI', 'Provider Organization Name (Legal Business Name)']],
-            self.physician_compare_df[['NPI', 'Facility Name']],
-            on='NPI',
-            how='outer'
-        )
+            npi_index(self.nppes_df[['NPI', 'Provider Organization Name (Legal Business Name)']]),
+            npi_index(self.physician_compare_df[['NPI', 'Facility Name']]),
+            left_index=True,
+            right_index=True,
+            how='outer',
+            sort=False
+        ).reset_index()
         
         # Clean and standardize organization names
         affiliations['Organization Name'] = (
@@ -155,7 +223,22 @@ class CMSDataProcessor:
             .str.strip()
         )
         
-        return affiliations.drop_duplicates()
+        # Deduplicate whole rows (as drop_duplicates did) on one uint64 key per
+        # row. Organization Name is derived from the two raw name columns, so
+        # (NPI, Facility Name, legal name) identifies a row. The name pair is
+        # factorized to a dense code (< 2**30) for the low bits, with NPI
+        # (< 2**34) in the high bits; +1 so missing names (-1) get code 0.
+        facility_codes, _ = pd.factorize(affiliations['Facility Name'])
+        legal_codes, legal_names = pd.factorize(affiliations['Provider Organization Name (Legal Business Name)'])
+        name_pairs = (facility_codes + 1).astype(np.int64) * (len(legal_names) + 1) + (legal_codes + 1)
+        pair_codes, _ = pd.factorize(name_pairs)
+        keys = (
+            (affiliations['NPI'].to_numpy(np.uint64) << np.uint64(30)) |
+            pair_codes.astype(np.uint64)
+        )
+        _, first_rows = np.unique(keys, return_index=True)
+        
+        return affiliations.iloc[np.sort(first_rows)]
         
     def analyze_data_structure(self) -> Dict:
         """
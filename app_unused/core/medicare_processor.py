@@ -4,11 +4,24 @@ Core module for processing Medicare billing data and building referral networks.
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from datetime import datetime
 import logging
 from pathlib import Path
 import re
-from typing import Dict, List, Tuple, Optional
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Tuple, Optional
+
+from .data_processor import shrink_dtypes
+
+# Optional: Aho-Corasick automaton for multi-keyword scans
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 logger = logging.getLogger(__name__)
 
@@ -16,12 +29,12 @@ class MedicareProcessor:
     """Process Medicare billing data to build referral networks."""
     
     # Provider type mappings
-    PCP_SPECIALTIES = {
+    PCP_SPECIALTIES = frozenset({
         'Internal Medicine',
         'Family Practice',
         'General Practice',
         'Pediatrics'
-    }
+    })
     
     # Common referral patterns with trigger keywords and average values
     REFERRAL_PATTERNS = {
@@ -43,21 +56,49 @@ class MedicareProcessor:
         }
     }
     
+    # Keyword -> (specialty, avg_value) for scanning service descriptions
+    REFERRAL_KEYWORDS = {
+        keyword: (specialty, pattern['avg_value'])
+        for specialty, pattern in REFERRAL_PATTERNS.items()
+        for keyword in pattern['keywords']
+    }
+    
     # Evaluation and Management codes for PCPs
-    PCP_EVAL_CODES = {
+    PCP_EVAL_CODES = frozenset({
         '99201', '99202', '99203', '99204', '99205',  # New patient
         '99211', '99212', '99213', '99214', '99215'   # Established patient
-    }
+    })
     
     # Consultation codes for specialists
-    SPECIALIST_CONSULT_CODES = {
+    SPECIALIST_CONSULT_CODES = frozenset({
         '99241', '99242', '99243', '99244', '99245'  # Office consultations
+    })
+    
+    # Medicare columns used downstream, with explicit types so every
+    # streamed batch parses to the same schema
+    MEDICARE_COLUMN_TYPES = {
+        'Rndrng_NPI': pa.int64(),
+        'Rndrng_Prvdr_Last_Org_Name': pa.string(),
+        'Rndrng_Prvdr_First_Name': pa.string(),
+        'Rndrng_Prvdr_State_Abrvtn': pa.string(),
+        'Rndrng_Prvdr_Zip5': pa.string(),
+        'Rndrng_Prvdr_City': pa.string(),
+        'Rndrng_Prvdr_Type': pa.string(),
+        'HCPCS_Cd': pa.string(),
+        'HCPCS_Desc': pa.string(),
+        'Tot_Srvcs': pa.float64(),
+        'Tot_Benes': pa.int64(),
+        'Avg_Mdcr_Alowd_Amt': pa.float64()
     }
     
+    # Low-cardinality columns stored as category codes
+    CATEGORICAL_COLUMNS = ['Provider Type', 'HCPCS Code', 'Provider State', 'Referral Pattern']
+    
     def __init__(self, data_dir: str):
         """Initialize the processor with data directory."""
         self.data_dir = Path(data_dir)
         self.medicare_file = self.data_dir / 'data' / 'Medicare Physician & Other Practitioners - by Provider and Service' / '2023' / 'MUP_PHY_R25_P05_V20_D23_Prov_Svc.csv'
+        self.providers_cache_file = self.data_dir / '.cache' / 'providers.parquet'
         self.providers_df = None
         self.referral_network = None
         
@@ -65,42 +106,93 @@ class MedicareProcessor:
         """Load Medicare billing data with memory-efficient chunking."""
         logger.info("Loading Medicare billing data...")
         
-        # Get total size for progress tracking
-        total_size = sum(1 for _ in open(self.medicare_file, 'r')) - 1  # Subtract header
+        # Reuse the processed snapshot while it is newer than the source CSV
+        if (
+            self.providers_cache_file.exists() and
+            self.providers_cache_file.stat().st_mtime >= self.medicare_file.stat().st_mtime
+        ):
+            self.providers_df = pd.read_parquet(self.providers_cache_file, engine='pyarrow')
+            logger.info(f"Loaded {len(self.providers_df):,} provider records from {self.providers_cache_file}")
+            return
         
-        # Read in chunks to manage memory
-        chunk_size = 100000  # Adjust based on available memory
-        chunks = []
+        # Stream record batches through Arrow's CSV parser, reading only the
+        # columns we use
+        block_size = 64 << 20  # Bytes per batch; adjust based on available memory
+        # Memory-map the file so the parser reads straight from the page cache
+        source = pa.memory_map(str(self.medicare_file), 'r')
+        reader = pa_csv.open_csv(
+            source,
+            read_options=pa_csv.ReadOptions(block_size=block_size, use_threads=True),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=list(self.MEDICARE_COLUMN_TYPES),
+                # Empty / NA cells become null (NaN in pandas), as pd.read_csv did
+                strings_can_be_null=True,
+                column_types=self.MEDICARE_COLUMN_TYPES
+            )
+        )
+        # Combine processed chunks as they are produced
+        with source:
+            self.providers_df = pd.concat(self._iter_processed_chunks(reader), ignore_index=True)
         
-        for chunk in pd.read_csv(self.medicare_file, chunksize=chunk_size, low_memory=False):
-            # Process each chunk
-            chunk = self._process_chunk(chunk)
-            chunks.append(chunk)
-            
-            # Log progress
-            logger.info(f"Processed {len(chunks) * chunk_size:,} of {total_size:,} records")
+        # Chunks carry their own category sets, so unify them after concat
+        for col in self.CATEGORICAL_COLUMNS:
+            self.providers_df[col] = self.providers_df[col].astype('category')
         
-        # Combine processed chunks
-        self.providers_df = pd.concat(chunks, ignore_index=True)
+        # Services, beneficiaries and amounts fit in 32-bit types
+        shrink_dtypes(self.providers_df)
         logger.info(f"Loaded {len(self.providers_df):,} provider records")
         
+        # Snapshot the processed frame so later runs skip the CSV parse
+        try:
+            self.providers_cache_file.parent.mkdir(parents=True, exist_ok=True)
+            self.providers_df.to_parquet(self.providers_cache_file, engine='pyarrow', compression='zstd', index=False)
+            logger.info(f"Cached provider records to {self.providers_cache_file}")
+        except Exception as e:
+            logger.warning(f"Could not cache provider records to {self.providers_cache_file}: {e}")
+        
+    def _iter_processed_chunks(self, reader) -> Iterator[pd.DataFrame]:
+        """Yield processed chunks from a CSV record batch reader."""
+        records_processed = 0
+        for chunk in self._process_batches(reader):
+            # Log progress (no total, which would need an extra pass over the file)
+            records_processed += len(chunk)
+            logger.info(f"Processed {records_processed:,} records")
+            
+            yield chunk
+        
+    def _process_batches(self, reader, max_workers: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """
+        Process record batches on a thread pool while the reader parses the next ones.
+        
+        At most max_workers batches are in flight, so memory stays bounded,
+        and chunks are yielded in file order.
+        """
+        max_workers = max_workers or os.cpu_count() or 1
+        pending = deque()
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for batch in reader:
+                pending.append(executor.submit(self._process_batch, batch))
+                if len(pending) >= max_workers:
+                    yield pending.popleft().result()
+            
+            while pending:
+                yield pending.popleft().result()
+        
+    def _process_batch(self, batch) -> pd.DataFrame:
+        """Convert an Arrow record batch to pandas and process it."""
+        return self._process_chunk(batch.to_pandas())
+        
     def _process_chunk(self, chunk: pd.DataFrame) -> pd.DataFrame:
         """Process a chunk of Medicare data."""
-        # Select relevant columns
-        columns = [
-            'Rndrng_NPI', 'Rndrng_Prvdr_Last_Org_Name', 'Rndrng_Prvdr_First_Name',
-            'Rndrng_Prvdr_State_Abrvtn', 'Rndrng_Prvdr_Zip5',
-            'Rndrng_Prvdr_City', 'Rndrng_Prvdr_Type',
-            'HCPCS_Cd', 'HCPCS_Desc',
-            'Tot_Srvcs', 'Tot_Benes',
-            'Avg_Mdcr_Alowd_Amt'
-        ]
-        
-        chunk = chunk[columns].copy()
+        # The CSV reader already projects to MEDICARE_COLUMN_TYPES, so no
+        # column selection (or defensive copy) is needed here
         
         # Clean and standardize data
-        chunk['Rndrng_Prvdr_Type'] = chunk['Rndrng_Prvdr_Type'].str.strip()
-        chunk['HCPCS_Cd'] = chunk['HCPCS_Cd'].str.strip()
+        chunk = chunk.assign(
+            Rndrng_Prvdr_Type=chunk['Rndrng_Prvdr_Type'].str.strip(),
+            HCPCS_Cd=chunk['HCPCS_Cd'].str.strip()
+        )
         
         # Rename columns to match our processing logic
         chunk = chunk.rename(columns={
@@ -118,63 +210,187 @@ class MedicareProcessor:
             'Avg_Mdcr_Alowd_Amt': 'Average Medicare Allowed Amount'
         })
         
+        chunk['Referral Pattern'] = self._tag_referral_pattern(chunk['HCPCS Description'])
+        
+        for col in self.CATEGORICAL_COLUMNS:
+            chunk[col] = chunk[col].astype('category')
+        
         return chunk
         
+    def _group_provider_services(self) -> pd.DataFrame:
+        """
+        Aggregate services per (NPI, Provider Type, HCPCS Code).
+        
+        The three keys are packed into one int64 (NPI in the high bits, then
+        the two category codes) so the groupby hashes a single integer
+        column instead of a tuple of keys; the keys are unpacked afterwards.
+        """
+        df = self.providers_df
+        provider_types = df['Provider Type'].astype('category')
+        hcpcs_codes = df['HCPCS Code'].astype('category')
+        
+        # Rows with a missing key are dropped, as groupby would
+        valid = (
+            df['NPI'].notna().to_numpy() &
+            (provider_types.cat.codes.to_numpy() >= 0) &
+            (hcpcs_codes.cat.codes.to_numpy() >= 0)
+        )
+        npi = df['NPI'].to_numpy()[valid].astype(np.int64)
+        type_codes = provider_types.cat.codes.to_numpy()[valid].astype(np.int64)
+        hcpcs = hcpcs_codes.cat.codes.to_numpy()[valid].astype(np.int64)
+        
+        hcpcs_bits = max(len(hcpcs_codes.cat.categories), 1).bit_length()
+        type_bits = max(len(provider_types.cat.categories), 1).bit_length()
+        npi_bits = int(npi.max()).bit_length() if len(npi) else 0
+        if npi_bits + type_bits + hcpcs_bits > 63:
+            # Key does not fit in an int64; fall back to the tuple groupby
+            return df.groupby(
+                ['NPI', 'Provider Type', 'HCPCS Code'], observed=True
+            ).agg({
+                'Number of Services': 'sum',
+                'Number of Medicare Beneficiaries': 'sum',
+                'Average Medicare Allowed Amount': 'mean'
+            }).reset_index()
+        
+        key = (npi << (type_bits + hcpcs_bits)) | (type_codes << hcpcs_bits) | hcpcs
+        grouped = pd.DataFrame({
+            'key': key,
+            'services': df['Number of Services'].to_numpy()[valid],
+            'beneficiaries': df['Number of Medicare Beneficiaries'].to_numpy()[valid],
+            'allowed': df['Average Medicare Allowed Amount'].to_numpy()[valid]
+        }).groupby('key', sort=True).agg(
+            services=('services', 'sum'),
+            beneficiaries=('beneficiaries', 'sum'),
+            allowed=('allowed', 'mean')
+        )
+        
+        # Unpack the keys back into columns
+        keys = grouped.index.to_numpy()
+        return pd.DataFrame({
+            'NPI': keys >> (type_bits + hcpcs_bits),
+            'Provider Type': pd.Categorical.from_codes(
+                (keys >> hcpcs_bits) & ((1 << type_bits) - 1),
+                categories=provider_types.cat.categories
+            ),
+            'HCPCS Code': pd.Categorical.from_codes(
+                keys & ((1 << hcpcs_bits) - 1),
+                categories=hcpcs_codes.cat.categories
+            ),
+            'Number of Services': grouped['services'].to_numpy(),
+            'Number of Medicare Beneficiaries': grouped['beneficiaries'].to_numpy(),
+            'Average Medicare Allowed Amount': grouped['allowed'].to_numpy()
+        })
+        
+    @classmethod
+    def _referral_matcher(cls):
+        """
+        Build (once) a matcher returning the (specialty, avg_value) matches in a
+        lowercased description.
+        
+        Uses a single Aho-Corasick automaton when pyahocorasick is installed,
+        otherwise one alternation regex over all keywords; either way each
+        description is scanned once for every keyword, and every occurrence
+        counts, overlapping ones included.
+        """
+        if getattr(cls, '_referral_matcher_fn', None) is None:
+            if ahocorasick is not None:
+                automaton = ahocorasick.Automaton()
+                for keyword, match in cls.REFERRAL_KEYWORDS.items():
+                    automaton.add_word(keyword, match)
+                automaton.make_automaton()
+                cls._referral_matcher_fn = lambda text: {match for _, match in automaton.iter(text)}
+            else:
+                # A lookahead tries every start position, and longest-first
+                # ordering finds the longest keyword there. Any other keyword
+                # starting at that position is a prefix of it, so each found
+                # keyword also yields the keywords it contains, as the
+                # automaton would.
+                keywords = sorted(cls.REFERRAL_KEYWORDS, key=len, reverse=True)
+                pattern = re.compile('(?=(' + '|'.join(map(re.escape, keywords)) + '))')
+                contained = {
+                    keyword: {match for other, match in cls.REFERRAL_KEYWORDS.items() if other in keyword}
+                    for keyword in keywords
+                }
+                cls._referral_matcher_fn = lambda text: set().union(
+                    *(contained[found] for found in pattern.findall(text))
+                )
+        return cls._referral_matcher_fn
+        
+    def _tag_referral_pattern(self, desc_series: pd.Series) -> pd.Series:
+        """
+        Tag each service description with the referral specialty its keywords
+        point to, preferring the highest-value specialty when several match.
+        """
+        matcher = self._referral_matcher()
+        
+        # Descriptions repeat heavily across rows, so scan each distinct one once
+        codes, uniques = pd.factorize(desc_series)
+        specialties = []
+        for desc in uniques:
+            matches = matcher(desc.lower())
+            specialties.append(max(matches, key=lambda match: match[1])[0] if matches else None)
+        
+        # Missing descriptions have code -1, which picks the trailing None
+        tags = np.array(specialties + [None], dtype=object)[codes]
+        return pd.Series(tags, index=desc_series.index, dtype='category')
+        
     def identify_referral_pairs(self) -> pd.DataFrame:
         """Identify potential referral pairs based on billing patterns."""
         logger.info("Identifying referral pairs...")
         
         # Group by provider and service
-        provider_services = self.providers_df.groupby(
-            ['NPI', 'Provider Type', 'HCPCS Code']
-        ).agg({
-            'Number of Services': 'sum',
-            'Number of Medicare Beneficiaries': 'sum',
-            'Average Medicare Allowed Amount': 'mean'
-        }).reset_index()
+        provider_services = self._group_provider_services()
         
-        # Identify PCPs and specialists
-        pcps = provider_services[
-            provider_services['Provider Type'].isin(self.PCP_SPECIALTIES)
-        ]
-        specialists = provider_services[
-            ~provider_services['Provider Type'].isin(self.PCP_SPECIALTIES)
+        # Identify PCPs and consultation services once, as boolean arrays.
+        # PCP status is resolved per category and then looked up by code,
+        # so provider type strings are compared once each rather than per row.
+        provider_types = provider_services['Provider Type'].astype('category').cat
+        pcp_codes = [
+            provider_types.categories.get_loc(specialty)
+            for specialty in self.PCP_SPECIALTIES
+            if specialty in provider_types.categories
         ]
+        is_pcp = np.isin(provider_types.codes.to_numpy(), pcp_codes)
+        is_consult = provider_services['HCPCS Code'].isin(self.SPECIALIST_CONSULT_CODES).to_numpy()
         
-        # Find potential referral pairs
-        referral_pairs = []
+        # Calculate referral probability based on:
+        # 1. Geographic proximity
+        # 2. Service volume
+        # 3. Patient overlap
+        # For now, use a simple scoring system that depends only on the specialist
+        score = (
+            provider_services['Number of Services'].to_numpy() * 0.4 +
+            provider_services['Number of Medicare Beneficiaries'].to_numpy() * 0.4 +
+            is_consult * 0.2
+        )
         
-        for _, pcp in pcps.iterrows():
-            pcp_services = set(pcp['HCPCS Code'])
-            
-            for _, specialist in specialists.iterrows():
-                # Check for consultation codes
-                if specialist['HCPCS Code'] in self.SPECIALIST_CONSULT_CODES:
-                    # Calculate referral probability based on:
-                    # 1. Geographic proximity
-                    # 2. Service volume
-                    # 3. Patient overlap
-                    
-                    # For now, use a simple scoring system
-                    score = (
-                        specialist['Number of Services'] * 0.4 +
-                        specialist['Number of Medicare Beneficiaries'] * 0.4 +
-                        (1 if specialist['HCPCS Code'] in self.SPECIALIST_CONSULT_CODES else 0) * 0.2
-                    )
-                    
-                    if score > 0.5:  # Threshold for considering a referral relationship
-                        referral_pairs.append({
-                            'referring_npi': pcp['NPI'],
-                            'referred_npi': specialist['NPI'],
-                            'referring_type': pcp['Provider Type'],
-                            'referred_type': specialist['Provider Type'],
-                            'referral_volume': specialist['Number of Services'],
-                            'patient_volume': specialist['Number of Medicare Beneficiaries'],
-                            'avg_value': specialist['Average Medicare Allowed Amount'],
-                            'confidence_score': score
-                        })
-        
-        return pd.DataFrame(referral_pairs)
+        # Only specialist consultations above the threshold indicate a referral relationship
+        pcps = provider_services[is_pcp]
+        specialists = provider_services.assign(confidence_score=score)[~is_pcp & is_consult & (score > 0.5)]
+        
+        # Every PCP is paired with every qualifying specialist
+        referral_pairs = pcps[['NPI', 'Provider Type']].rename(columns={
+            'NPI': 'referring_npi',
+            'Provider Type': 'referring_type'
+        }).merge(
+            specialists[[
+                'NPI', 'Provider Type', 'Number of Services',
+                'Number of Medicare Beneficiaries', 'Average Medicare Allowed Amount',
+                'confidence_score'
+            ]].rename(columns={
+                'NPI': 'referred_npi',
+                'Provider Type': 'referred_type',
+                'Number of Services': 'referral_volume',
+                'Number of Medicare Beneficiaries': 'patient_volume',
+                'Average Medicare Allowed Amount': 'avg_value'
+            }),
+            how='cross'
+        )
+        
+        return referral_pairs[[
+            'referring_npi', 'referred_npi', 'referring_type', 'referred_type',
+            'referral_volume', 'patient_volume', 'avg_value', 'confidence_score'
+        ]]
         
     def calculate_leakage_metrics(self, referral_pairs: pd.DataFrame) -> Dict:
         """Calculate referral leakage metrics."""
@@ -191,8 +407,11 @@ class MedicareProcessor:
         }).reset_index()
         
         # Calculate leakage metrics
-        total_referrals = type_pairs['referral_volume'].sum()
-        total_value = (type_pairs['referral_volume'] * type_pairs['avg_value']).sum()
+        # Missing values count as 0, matching the NaN-skipping Series sums
+        volume = type_pairs['referral_volume'].to_numpy(dtype=np.float64, na_value=0.0)
+        value = type_pairs['avg_value'].to_numpy(dtype=np.float64, na_value=0.0)
+        total_referrals = float(volume.sum())
+        total_value = float(np.dot(volume, value))
         
         # For now, assume 30% leakage rate (this should be calculated based on actual data)
         leakage_rate = 0.30
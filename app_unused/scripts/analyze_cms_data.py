@@ -6,6 +6,8 @@ import sys
 from pathlib import Path
 import logging
 from datetime import datetime
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 
 # Add the parent directory to the Python path
 sys.path.append(str(Path(__file__).parent.parent.parent))
@@ -65,7 +67,11 @@ def main():
         
         # Save affiliations to CSV for further analysis
         output_file = f'provider_affiliations_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-        affiliations.to_csv(output_file, index=False)
+        pa_csv.write_csv(
+            pa.Table.from_pandas(affiliations, preserve_index=False),
+            output_file,
+            write_options=pa_csv.WriteOptions(include_header=True, batch_size=64 << 10)
+        )
         logger.info(f"\nSaved provider affiliations to {output_file}")
         
     except Exception as e:
@@ -8,10 +8,19 @@ import pandas as pd
 import numpy as np
 from typing import Dict, List, Tuple
 import logging
+import functools
 from datetime import datetime
-import json
+import orjson
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from pathlib import Path
 
+# Optional: Polars for the groupby/pivot-heavy charts
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -19,17 +28,54 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def _write_csv(df: pd.DataFrame, path: Path) -> None:
+    """Write a DataFrame (without its index) to CSV using Arrow's native writer."""
+    pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), str(path))
+
+def _memoized_figure(method):
+    """
+    Cache a figure-building method per dashboard. The dashboard's data is fixed
+    after __init__, so the method name is the whole key.
+
+    Every call returns the same go.Figure object: callers must not mutate it
+    (update_layout, add_trace, ...) in place. Copy it first with go.Figure(fig).
+    """
+    @functools.wraps(method)
+    def wrapper(self):
+        key = method.__name__
+        if key not in self._figures:
+            self._figures[key] = method(self)
+        return self._figures[key]
+    return wrapper
+
 class ReferralDashboard:
     """Generates executive dashboards for referral analytics."""
     
-    def __init__(self, network_data: pd.DataFrame):
+    def __init__(self, network_data):
         """
         Initialize the dashboard generator.
         
         Args:
-            network_data: DataFrame containing referral network data
+            network_data: pandas or Polars DataFrame containing referral network data
         """
+        # Keep a Polars frame if one was passed in; otherwise _pl_data builds
+        # it from pandas only when a Polars-backed chart first needs it
+        if pl is not None and isinstance(network_data, pl.DataFrame):
+            self.__dict__['_pl_data'] = network_data
+            network_data = network_data.to_pandas()
         self.network_data = network_data
+        
+        # Figures built so far, by method name (see _memoized_figure)
+        self._figures = {}
+        
+        # Hot columns as plain arrays, so methods skip Series construction
+        self._ref_org = network_data['referring_organization'].to_numpy()
+        self._to_org = network_data['referred_organization'].to_numpy()
+        self._specialty = network_data['specialty'].to_numpy()
+        self._count = network_data['referral_count'].to_numpy(dtype=np.float64)
+        self._loss = network_data['revenue_loss'].to_numpy(dtype=np.float64)
+        self._in_net = network_data['is_in_network'].to_numpy(dtype=bool)
+        
         self.colors = {
             'in_network': '#2ecc71',  # Green
             'leaked': '#e74c3c',      # Red
@@ -37,27 +83,26 @@ class ReferralDashboard:
             'text': '#ecf0f1'         # Light gray
         }
     
+    @_memoized_figure
     def create_sankey_diagram(self) -> go.Figure:
         """Create a Sankey diagram showing referral flows."""
-        # Prepare data for Sankey diagram
-        pcp_nodes = self.network_data['referring_organization'].unique()
-        specialist_nodes = self.network_data['referred_organization'].unique()
+        # Prepare data for Sankey diagram: factorize yields each column's
+        # node labels and the per-row node codes in one pass
+        src_codes, src_labels = pd.factorize(self._ref_org)
+        tgt_codes, tgt_labels = pd.factorize(self._to_org)
         
-        # Create node labels
-        all_nodes = list(pcp_nodes) + list(specialist_nodes)
-        node_labels = all_nodes
+        # Create node labels (object array, handed straight to plotly)
+        node_labels = np.concatenate([np.asarray(src_labels, dtype=object), np.asarray(tgt_labels, dtype=object)])
         
-        # Create source and target indices
-        source_indices = [all_nodes.index(org) for org in self.network_data['referring_organization']]
-        target_indices = [all_nodes.index(org) + len(pcp_nodes) 
-                         for org in self.network_data['referred_organization']]
+        # Create source and target indices; specialists follow the PCPs
+        source_indices = src_codes.astype(np.int32)
+        target_indices = (tgt_codes + len(src_labels)).astype(np.int32)
         
         # Create values (referral counts)
-        values = self.network_data['referral_count']
+        values = self._count
         
         # Create colors based on in-network status
-        colors = [self.colors['in_network'] if in_net else self.colors['leaked']
-                 for in_net in self.network_data['is_in_network']]
+        colors = np.where(self._in_net, self.colors['in_network'], self.colors['leaked'])
         
         # Create Sankey diagram
         fig = go.Figure(data=[go.Sankey(
@@ -86,26 +131,39 @@ class ReferralDashboard:
         
         return fig
     
+    @functools.cached_property
+    def _pl_data(self):
+        """Polars copy of network_data for aggregations (None without Polars)"""
+        return pl.from_pandas(self.network_data) if pl is not None else None
+    
+    @_memoized_figure
     def create_leakage_by_specialty(self) -> go.Figure:
         """Create a bar chart showing leakage rates by specialty."""
-        # Calculate leakage rates by specialty
-        specialty_metrics = self.network_data.groupby('specialty').agg({
-            'referral_count': 'sum',
-            'revenue_loss': 'sum'
-        }).reset_index()
-        
-        # Calculate leakage rate
-        specialty_metrics['leakage_rate'] = (
-            specialty_metrics['revenue_loss'] / 
-            specialty_metrics['referral_count'] * 100
-        )
-        
-        # Sort by leakage rate
-        specialty_metrics = specialty_metrics.sort_values('leakage_rate', ascending=False)
+        # Calculate leakage rates by specialty; top 10 by leakage rate, ties
+        # broken by specialty name so both engines pick the same rows
+        if self._pl_data is not None:
+            specialty_metrics = self._pl_data.group_by('specialty').agg([
+                pl.col('referral_count').sum(),
+                pl.col('revenue_loss').sum()
+            ]).with_columns(
+                (pl.col('revenue_loss') / pl.col('referral_count') * 100).alias('leakage_rate')
+            ).sort(['leakage_rate', 'specialty'], descending=[True, False]).head(10).to_pandas()
+        else:
+            specialty_metrics = self.network_data.groupby('specialty').agg({
+                'referral_count': 'sum',
+                'revenue_loss': 'sum'
+            }).reset_index()
+            specialty_metrics['leakage_rate'] = (
+                specialty_metrics['revenue_loss'] / 
+                specialty_metrics['referral_count'] * 100
+            )
+            specialty_metrics = specialty_metrics.sort_values(
+                ['leakage_rate', 'specialty'], ascending=[False, True]
+            ).head(10)
         
         # Create bar chart
         fig = px.bar(
-            specialty_metrics.head(10),
+            specialty_metrics,
             x='specialty',
             y='leakage_rate',
             color='revenue_loss',
@@ -130,17 +188,24 @@ class ReferralDashboard:
         
         return fig
     
+    @_memoized_figure
     def create_referral_heatmap(self) -> go.Figure:
         """Create a heatmap of referral patterns."""
-        # Create pivot table of referral counts
-        heatmap_data = pd.pivot_table(
-            self.network_data,
-            values='referral_count',
-            index='referring_organization',
-            columns='referred_organization',
-            aggfunc='sum',
-            fill_value=0
-        )
+        # Create matrix of referral counts (hash groupby over observed pairs,
+        # then unstack, rather than pivot_table's categorical path)
+        if self._pl_data is not None:
+            heatmap_data = self._pl_data.pivot(
+                on='referred_organization',
+                index='referring_organization',
+                values='referral_count',
+                aggregate_function='sum'
+            ).fill_null(0).to_pandas().set_index('referring_organization')
+        else:
+            heatmap_data = self.network_data.groupby(
+                ['referring_organization', 'referred_organization'], sort=False, observed=True
+            )['referral_count'].sum().unstack(fill_value=0)
+        # Same row/column order from either engine
+        heatmap_data = heatmap_data.sort_index().sort_index(axis=1)
         
         # Create heatmap
         fig = px.imshow(
@@ -163,12 +228,18 @@ class ReferralDashboard:
         
         return fig
     
+    @_memoized_figure
     def create_financial_impact(self) -> go.Figure:
         """Create a financial impact visualization."""
-        # Calculate monthly revenue loss
-        self.network_data['month'] = pd.to_datetime(self.network_data['referral_date']).dt.to_period('M')
-        monthly_loss = self.network_data.groupby('month')['revenue_loss'].sum().reset_index()
-        monthly_loss['month'] = monthly_loss['month'].astype(str)
+        # Calculate monthly revenue loss; dates repeat heavily, so parse each
+        # distinct string once, and bucket by datetime64[M] rather than Periods
+        dates = pd.to_datetime(self.network_data['referral_date'], cache=True)
+        month = dates.to_numpy().astype('datetime64[M]')
+        monthly_loss = pd.Series(self._loss).groupby(month).sum()
+        monthly_loss = pd.DataFrame({
+            'month': monthly_loss.index.to_numpy().astype('datetime64[M]').astype(str),
+            'revenue_loss': monthly_loss.to_numpy()
+        })
         
         # Create line chart
         fig = px.line(
@@ -192,20 +263,49 @@ class ReferralDashboard:
         
         return fig
     
-    def generate_executive_summary(self) -> Dict:
-        """Generate an executive summary of the analysis."""
-        total_referrals = len(self.network_data)
-        leaked_referrals = len(self.network_data[~self.network_data['is_in_network']])
-        total_revenue_loss = self.network_data['revenue_loss'].sum()
+    def _leakage_by_specialty(self) -> pd.DataFrame:
+        """
+        Sum leaked referrals and revenue loss per specialty.
+        
+        Specialties are factorized to integer codes and summed with
+        np.bincount, one pass per column; in-network rows are zeroed out
+        rather than filtered away first. Specialties with no leaked
+        referrals (and missing specialties) are dropped.
+        """
+        codes, specialties = pd.factorize(self._specialty)
+        valid = codes >= 0
+        codes, leaked_mask = codes[valid], ~self._in_net[valid]
+        n_groups = len(specialties)
+        
+        def leaked_sum(values):
+            return np.bincount(codes, weights=np.where(leaked_mask, values[valid], 0), minlength=n_groups)
+        
+        has_leaks = np.bincount(codes[leaked_mask], minlength=n_groups) > 0
+        return pd.DataFrame({
+            # bincount weights are float64; referral counts are whole numbers
+            'referral_count': np.rint(leaked_sum(self._count)).astype(np.int64),
+            'revenue_loss': leaked_sum(self._loss)
+        }, index=pd.Index(specialties, name='specialty'))[has_leaks]
+    
+    def generate_executive_summary(self, leakage_by_specialty: pd.DataFrame = None) -> Dict:
+        """
+        Generate an executive summary of the analysis.
+        
+        Args:
+            leakage_by_specialty: Precomputed per-specialty leakage, as returned
+                by _leakage_by_specialty (computed here if not given)
+        """
+        total_referrals = len(self._in_net)
+        leaked_referrals = int(total_referrals - self._in_net.sum())
+        total_revenue_loss = self._loss.sum()
         
         # Calculate leakage rate
         leakage_rate = (leaked_referrals / total_referrals) * 100
         
         # Find top leaking specialties
-        top_leaking = self.network_data[~self.network_data['is_in_network']].groupby('specialty').agg({
-            'referral_count': 'sum',
-            'revenue_loss': 'sum'
-        }).sort_values('revenue_loss', ascending=False).head(3)
+        if leakage_by_specialty is None:
+            leakage_by_specialty = self._leakage_by_specialty()
+        top_leaking = leakage_by_specialty.nlargest(3, 'revenue_loss')
         
         # Calculate projected ROI
         current_annual_loss = total_revenue_loss * 12
@@ -243,35 +343,23 @@ class ReferralDashboard:
         output_path.mkdir(parents=True, exist_ok=True)
         
         # Save network data
-        self.network_data.to_csv(
-            output_path / 'referral_network.csv',
-            index=False
-        )
+        _write_csv(self.network_data, output_path / 'referral_network.csv')
         
-        # Save leakage summary
-        leakage_summary = self.network_data[~self.network_data['is_in_network']].groupby('specialty').agg({
-            'referral_count': 'sum',
-            'revenue_loss': 'sum'
-        }).reset_index()
-        leakage_summary.to_csv(
-            output_path / 'leakage_summary.csv',
-            index=False
-        )
+        # Save leakage summary (shared with the executive summary below)
+        leakage_summary = self._leakage_by_specialty()
+        _write_csv(leakage_summary.reset_index(), output_path / 'leakage_summary.csv')
         
         # Save financial impact
-        financial_impact = self.network_data.groupby('referring_organization').agg({
+        financial_impact = self.network_data.groupby('referring_organization', sort=False, observed=True).agg({
             'referral_count': 'sum',
             'revenue_loss': 'sum'
         }).reset_index()
-        financial_impact.to_csv(
-            output_path / 'financial_impact.csv',
-            index=False
-        )
+        _write_csv(financial_impact, output_path / 'financial_impact.csv')
         
         # Save executive summary
-        summary = self.generate_executive_summary()
-        with open(output_path / 'executive_summary.json', 'w') as f:
-            json.dump(summary, f, indent=2)
+        summary = self.generate_executive_summary(leakage_summary)
+        with open(output_path / 'executive_summary.json', 'wb') as f:
+            f.write(orjson.dumps(summary, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
         
         logger.info(f"Results saved to {output_path}")
 
@@ -289,11 +377,12 @@ def main():
     heatmap = dashboard.create_referral_heatmap()
     financial = dashboard.create_financial_impact()
     
-    # Save visualizations
-    sankey.write_html('referral_flow.html')
-    leakage.write_html('leakage_by_specialty.html')
-    heatmap.write_html('referral_patterns.html')
-    financial.write_html('financial_impact.html')
+    # Save visualizations; the pages share one plotly.min.js written
+    # alongside them instead of each embedding its own ~3MB copy
+    sankey.write_html('referral_flow.html', include_plotlyjs='directory')
+    leakage.write_html('leakage_by_specialty.html', include_plotlyjs='directory')
+    heatmap.write_html('referral_patterns.html', include_plotlyjs='directory')
+    financial.write_html('financial_impact.html', include_plotlyjs='directory')
     
     # Generate and save summary
     dashboard.save_results('analysis_results')
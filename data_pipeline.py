@@ -17,9 +17,19 @@ to refresh the insights for the dashboard.
 
 import pandas as pd
 import numpy as np
-import json
+import orjson
 import os
-from sklearn.preprocessing import LabelEncoder
+import argparse
+import gc
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+# Optional: Polars engine for the market and affiliation stages
+try:
+    import polars as pl
+except ImportError:
+    pl = None
 # TODO: import NetworkX, geopy, and other libraries as needed
 
 # --- Constants for File Paths ---
@@ -31,28 +41,161 @@ MEDICARE_UTILIZATION_FILE = os.path.join(DATA_DIR, 'Medicare Physician & Other P
 ENDPOINT_FILE = os.path.join(DATA_DIR, 'endpoint_pfile_20050523-20250608.csv')
 OUTPUT_INSIGHTS_FILE = 'outputs/real_insights.json'
 OUTPUT_FEATURES_FILE = 'outputs/provider_features.json'
+OUTPUT_FEATURES_PARQUET = 'outputs/provider_features.parquet'
+OUTPUT_MARKET_ANALYSIS_PARQUET = 'outputs/market_analysis.parquet'
+OUTPUT_PROVIDER_NAMES_PARQUET = 'outputs/provider_names.parquet'
+
+# --- Columns Used Downstream ---
+# Only these columns are parsed from each file; everything else is skipped.
+NPI_NAME_COLUMNS = ['NPI', 'Provider Last Name (Legal Name)', 'Provider First Name']
+NPI_FEATURE_COLUMNS = [
+    'NPI',
+    'Provider Business Practice Location Address Postal Code',
+    'Healthcare Provider Taxonomy Code_1'
+]
+NPI_COLUMNS = NPI_NAME_COLUMNS + NPI_FEATURE_COLUMNS[1:]
+MEDICARE_COLUMNS = [
+    'Rndrng_NPI', 'Rndrng_Prvdr_Zip5', 'Rndrng_Prvdr_Type', 'HCPCS_Cd',
+    'Tot_Srvcs', 'Tot_Benes', 'Avg_Sbmtd_Chrg'
+]
+ENDPOINT_COLUMNS = ['NPI', 'Endpoint', 'Affiliation Legal Business Name']
+
+# Fields of each market analysis record, in output order
+MARKET_ANALYSIS_COLUMNS = [
+    'zipCode', 'specialty', 'providerName', 'providerNPI', 'providerRevenue',
+    'providerServices', 'marketSharePercentage', 'providerCount', 'totalMarketRevenue'
+]
+
+# Identifier-like columns are kept as strings (zip codes keep leading zeros)
+STRING_COLUMN_TYPES = {
+    'NPI': pa.string(),
+    'Rndrng_NPI': pa.string(),
+    'Rndrng_Prvdr_Zip5': pa.string(),
+    'Provider Business Practice Location Address Postal Code': pa.string(),
+    'Healthcare Provider Taxonomy Code_1': pa.string()
+}
+
+# Billing measures: beneficiary counts are narrowed to int32; charges and
+# service counts stay float64 because revenue is summed from their product
+NUMERIC_COLUMN_TYPES = {
+    'Tot_Srvcs': pa.float64(),
+    'Tot_Benes': pa.int32(),
+    'Avg_Sbmtd_Chrg': pa.float64()
+}
+BILLING_DTYPES = {'Tot_Srvcs': 'float64', 'Tot_Benes': 'int32', 'Avg_Sbmtd_Chrg': 'float64', 'Total_Charges': 'float64'}
+
+
+def open_csv_columns(path, columns):
+    """
+    Opens a streaming Arrow CSV reader over the given columns, skipping
+    malformed rows. Parsing is multithreaded and happens batch by batch.
+    """
+    return pa_csv.open_csv(
+        path,
+        read_options=pa_csv.ReadOptions(block_size=64 << 20),
+        parse_options=pa_csv.ParseOptions(invalid_row_handler=lambda row: 'skip'),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=columns,
+            # Empty / NA cells become null (NaN in pandas), as pd.read_csv did
+            strings_can_be_null=True,
+            column_types={
+                c: t for c, t in {**STRING_COLUMN_TYPES, **NUMERIC_COLUMN_TYPES}.items() if c in columns
+            }
+        )
+    )
+
 
+def iter_batches(reader, nrows):
+    """Yields record batches from reader until nrows rows have been produced."""
+    rows_read = 0
+    for batch in reader:
+        if rows_read + batch.num_rows >= nrows:
+            yield batch.slice(0, nrows - rows_read)
+            return
+        rows_read += batch.num_rows
+        yield batch
 
-def load_datasets(npi_rows=1500000, physician_rows=200000, medicare_rows=500000, endpoint_rows=200000):
+
+def arrow_to_pandas(data):
     """
-    Loads all necessary datasets. Increased row counts for richer feature engineering.
+    Converts an Arrow table or batch to pandas. String columns come back as
+    Arrow-backed pandas strings; numeric columns as regular NumPy dtypes.
+    """
+    return data.to_pandas(
+        types_mapper=lambda t: pd.ArrowDtype(t) if pa.types.is_string(t) else None
+    )
+
+
+def read_csv_columns(path, columns, nrows):
+    """Reads up to nrows rows of the given columns from a CSV into pandas."""
+    reader = open_csv_columns(path, columns)
+    table = pa.Table.from_batches(list(iter_batches(reader, nrows)), schema=reader.schema)
+    return arrow_to_pandas(table)
+
+
+def load_nppes(npi_rows=1500000):
+    """
+    Streams the NPI file once, building the NPI-to-name map batch by batch and
+    keeping only the columns needed for feature engineering.
+
+    Returns:
+        tuple: (provider_name_map, nppes_df with NPI_FEATURE_COLUMNS)
     """
-    print("--- Starting Data Loading Stage ---")
-    
     print(f"Loading NPI data (up to {npi_rows:,} rows)...")
-    nppes_df = pd.read_csv(NPI_FILE, nrows=npi_rows, low_memory=False, on_bad_lines='skip')
+    print("Building provider NPI-to-Name map...")
+    reader = open_csv_columns(NPI_FILE, NPI_COLUMNS)
+    provider_name_map = {}
+    feature_batches = []
+    for batch in iter_batches(reader, npi_rows):
+        provider_name_map.update(provider_names(arrow_to_pandas(batch.select(NPI_NAME_COLUMNS))))
+        feature_batches.append(batch.select(NPI_FEATURE_COLUMNS))
     
-    print(f"Loading Physician Compare data (up to {physician_rows:,} rows)...")
-    physician_df = pd.read_csv(PHYSICIAN_COMPARE_FILE, nrows=physician_rows, low_memory=False, on_bad_lines='skip')
+    feature_schema = pa.schema([reader.schema.field(col) for col in NPI_FEATURE_COLUMNS])
+    nppes_df = arrow_to_pandas(pa.Table.from_batches(feature_batches, schema=feature_schema))
+    return provider_name_map, nppes_df
+
+
+def load_datasets(npi_rows=1500000, medicare_rows=500000, endpoint_rows=200000):
+    """
+    Loads all necessary datasets. Increased row counts for richer feature engineering.
+    The NPI file is streamed: only the name map and the feature columns are kept.
+    The three files are read concurrently; Arrow releases the GIL while parsing.
+    """
+    print("--- Starting Data Loading Stage ---")
     
     print(f"Loading Medicare utilization data (up to {medicare_rows:,} rows)...")
-    billing_df = pd.read_csv(MEDICARE_UTILIZATION_FILE, nrows=medicare_rows, low_memory=False, on_bad_lines='skip')
-    
     print(f"Loading provider endpoint/affiliation data (up to {endpoint_rows:,} rows)...")
-    endpoints_df = pd.read_csv(ENDPOINT_FILE, nrows=endpoint_rows, low_memory=False, on_bad_lines='skip')
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        nppes_future = executor.submit(load_nppes, npi_rows)
+        billing_future = executor.submit(read_csv_columns, MEDICARE_UTILIZATION_FILE, MEDICARE_COLUMNS, medicare_rows)
+        endpoints_future = executor.submit(read_csv_columns, ENDPOINT_FILE, ENDPOINT_COLUMNS, endpoint_rows)
+        provider_name_map, nppes_df = nppes_future.result()
+        billing_df = billing_future.result()
+        endpoints_df = endpoints_future.result()
+    prepare_billing_df(billing_df)
     
     print("--- Data Loading Complete ---\n")
-    return nppes_df, physician_df, billing_df, endpoints_df
+    return provider_name_map, nppes_df, billing_df, endpoints_df
+
+
+def scan_datasets(medicare_rows=500000, endpoint_rows=200000):
+    """
+    Lazily scans the Medicare utilization and endpoint files with Polars.
+    Nothing is read until the returned LazyFrames are collected.
+    """
+    print("Scanning Medicare utilization and endpoint data with Polars...")
+    billing_lf = pl.scan_csv(
+        MEDICARE_UTILIZATION_FILE,
+        n_rows=medicare_rows,
+        schema_overrides={
+            'Rndrng_NPI': pl.Utf8, 'Rndrng_Prvdr_Zip5': pl.Utf8,
+            'Tot_Srvcs': pl.Float64, 'Tot_Benes': pl.Int32, 'Avg_Sbmtd_Chrg': pl.Float64
+        },
+        ignore_errors=True,
+        low_memory=True
+    )
+    endpoints_lf = pl.scan_csv(ENDPOINT_FILE, n_rows=endpoint_rows, ignore_errors=True, low_memory=True)
+    return billing_lf, endpoints_lf
 
 
 def build_provider_name_map(nppes_df):
@@ -66,24 +209,29 @@ def build_provider_name_map(nppes_df):
         dict: A dictionary where keys are NPIs and values are formatted names.
     """
     print("Building provider NPI-to-Name map...")
-    provider_names = {}
-    for _, row in nppes_df.iterrows():
-        npi = str(row['NPI'])
-        last_name = str(row.get('Provider Last Name (Legal Name)', ''))
-        first_name = str(row.get('Provider First Name', ''))
-        provider_names[npi] = f"{last_name}, {first_name}".strip(', ')
-    return provider_names
+    return provider_names(nppes_df)
 
 
-def analyze_provider_affiliations(endpoints_df):
+def provider_names(nppes_df):
+    """Maps each NPI in nppes_df to its formatted "Last, First" name."""
+    npi = nppes_df['NPI'].astype(str).to_numpy()
+    last_name = nppes_df['Provider Last Name (Legal Name)'].fillna('').astype(str)
+    first_name = nppes_df['Provider First Name'].fillna('').astype(str)
+    names = last_name.str.cat(first_name, sep=', ').str.strip(', ').to_numpy()
+    return dict(zip(npi, names))
+
+
+def analyze_provider_affiliations(endpoints_df, top_n=20):
     """
     Analyzes the endpoint data to identify and rank provider networks.
 
     Args:
         endpoints_df (pd.DataFrame): The DataFrame with provider affiliation data.
+        top_n (int): Number of leading networks to return as records.
 
     Returns:
-        pd.DataFrame: A DataFrame of provider networks, sorted by the number of affiliated providers.
+        tuple: (DataFrame of provider networks sorted by the number of affiliated
+            providers, list of records for the top_n networks)
     """
     print("--- Starting Provider Affiliation Analysis ---")
     
@@ -97,70 +245,187 @@ def analyze_provider_affiliations(endpoints_df):
     print(f"Identified {len(affiliation_groups)} provider organizations.")
     print("--- Affiliation Analysis Complete ---\n")
     
-    return affiliation_groups
+    return affiliation_groups, affiliation_groups.head(top_n).to_dict('records')
+
+
+def downcast_billing_columns(billing_df):
+    """
+    Casts the billing measures to BILLING_DTYPES in place. Frames read by
+    open_csv_columns already arrive in these dtypes; this covers other sources. Columns
+    with missing values stay float64 rather than failing the int cast.
+    """
+    for col, dtype in BILLING_DTYPES.items():
+        if col not in billing_df.columns or billing_df[col].dtype == dtype:
+            continue
+        values = pd.to_numeric(billing_df[col], errors='coerce')
+        if dtype.startswith('int') and values.isna().any():
+            continue
+        billing_df[col] = values.astype(dtype)
+    return billing_df
+
+
+def prepare_billing_df(billing_df):
+    """
+    One-time normalization of the billing frame right after loading: typed
+    measures, 5-digit zip codes and Total_Charges. Later stages assume these.
+    """
+    downcast_billing_columns(billing_df)
+    billing_df['Rndrng_Prvdr_Zip5'] = billing_df['Rndrng_Prvdr_Zip5'].str.pad(5, side='left', fillchar='0').str.slice(0, 5)
+    billing_df['Total_Charges'] = billing_df['Tot_Srvcs'] * billing_df['Avg_Sbmtd_Chrg']
+    return billing_df
+
+
+def ensure_c_contiguous(df, columns):
+    """
+    Reallocates any numpy-backed column whose buffer is not C-contiguous (e.g.
+    after a copy that produced Fortran-ordered blocks) so groupby reductions
+    stride through memory linearly. Modifies df in place and returns it.
+    """
+    for col in columns:
+        if not isinstance(df[col].dtype, np.dtype):
+            continue
+        arr = df[col].to_numpy(copy=False)
+        if not arr.flags['C_CONTIGUOUS']:
+            df[col] = np.ascontiguousarray(arr)
+    return df
 
 
 def calculate_market_analysis(billing_df, provider_name_map):
     """
     Performs market share analysis on the Medicare billing data.
     Now outputs all providers and their market shares for each zip/specialty market.
+
+    Returns:
+        pd.DataFrame: One row per provider and market, with the insights JSON
+            field names as columns. Records are only built for rows written out.
     """
     print("--- Starting Market Share Analysis ---")
     
-    billing_df['Rndrng_NPI'] = billing_df['Rndrng_NPI'].astype(str)
-    billing_df['Total_Charges'] = billing_df['Tot_Srvcs'] * billing_df['Avg_Sbmtd_Chrg']
     zip_col = 'Rndrng_Prvdr_Zip5'
     specialty_col = 'Rndrng_Prvdr_Type'
-    billing_df[zip_col] = billing_df[zip_col].astype(str).str.zfill(5).str[:5]
-    
-    print("Grouping data by zip code and specialty...")
-    market_groups = billing_df.groupby([zip_col, specialty_col])
-    market_analysis_results = []
-    competitive_market_samples = []
-    
-    print(f"Analyzing {len(market_groups)} markets...")
-    for (zip_code, specialty), group in market_groups:
-        total_market_revenue = group['Total_Charges'].sum()
-        provider_revenue = group.groupby('Rndrng_NPI')['Total_Charges'].sum()
-        provider_services = group.groupby('Rndrng_NPI')['Tot_Srvcs'].sum()
-        provider_count = provider_revenue.shape[0]
-        market_providers = []
-        for npi, revenue in provider_revenue.items():
-            name = provider_name_map.get(npi, 'Unknown Provider')
-            services = provider_services.get(npi, 0)
-            market_share = (revenue / total_market_revenue) * 100 if total_market_revenue > 0 else 0
-            market_providers.append({
-                'zipCode': zip_code,
-                'specialty': specialty,
-                'providerName': name,
-                'providerNPI': npi,
-                'providerRevenue': revenue,
-                'providerServices': services,
-                'marketSharePercentage': market_share,
-                'providerCount': provider_count,
-                'totalMarketRevenue': total_market_revenue
-            })
-        # Add to results
-        market_analysis_results.extend(market_providers)
-        # Save a sample of competitive markets
-        if provider_count > 1 and len(competitive_market_samples) < 5:
-            competitive_market_samples.append(market_providers)
+    
+    # Group on category codes rather than hashing the key strings
+    market_keys = [zip_col, specialty_col]
+    for col in market_keys + ['Rndrng_NPI']:
+        billing_df[col] = billing_df[col].astype('category')
+    ensure_c_contiguous(billing_df, ['Tot_Srvcs', 'Avg_Sbmtd_Chrg', 'Total_Charges'])
+    
+    print("Grouping data by zip code, specialty and provider...")
+    providers = billing_df.groupby(market_keys + ['Rndrng_NPI'], observed=True).agg(
+        providerRevenue=('Total_Charges', 'sum'),
+        providerServices=('Tot_Srvcs', 'sum')
+    ).reset_index()
+    
+    # Market totals broadcast back onto each provider row
+    market_groups = providers.groupby(market_keys, sort=False, observed=True)
+    total_market_revenue = market_groups['providerRevenue'].transform('sum')
+    print(f"Analyzing {market_groups.ngroups} markets...")
+    
+    # Look names up once per distinct NPI, then expand by category code
+    npis = providers['Rndrng_NPI'].cat
+    names = pd.Series(npis.categories).map(provider_name_map).fillna('Unknown Provider').to_numpy()
+    providers['providerName'] = names[npis.codes.to_numpy()]
+    providers['marketSharePercentage'] = np.where(
+        total_market_revenue > 0,
+        providers['providerRevenue'] / total_market_revenue.where(total_market_revenue > 0, 1) * 100,
+        0.0
+    )
+    providers['providerCount'] = market_groups['Rndrng_NPI'].transform('size')
+    providers['totalMarketRevenue'] = total_market_revenue
+    
+    market_analysis_results = providers.rename(columns={
+        zip_col: 'zipCode',
+        specialty_col: 'specialty',
+        'Rndrng_NPI': 'providerNPI'
+    })[MARKET_ANALYSIS_COLUMNS]
+    
     # Logging: print a few competitive markets
     print("--- Sample competitive markets (multiple providers): ---")
-    for market in competitive_market_samples:
-        print(f"Zip: {market[0]['zipCode']}, Specialty: {market[0]['specialty']}, Providers: {len(market)}")
-        for p in market:
-            print(f"  {p['providerName']} (NPI: {p['providerNPI']}): {p['marketSharePercentage']:.1f}% share, Revenue: ${p['providerRevenue']:.2f}")
+    competitive = providers[providers['providerCount'] > 1]
+    for zip_code, specialty in competitive[market_keys].drop_duplicates().head(5).itertuples(index=False):
+        market = competitive[(competitive[zip_col] == zip_code) & (competitive[specialty_col] == specialty)]
+        print(f"Zip: {zip_code}, Specialty: {specialty}, Providers: {len(market)}")
+        for p in market.itertuples(index=False):
+            print(f"  {p.providerName} (NPI: {p.Rndrng_NPI}): {p.marketSharePercentage:.1f}% share, Revenue: ${p.providerRevenue:.2f}")
     print("--- Market Share Analysis Complete ---\n")
     return market_analysis_results
 
 
+def analyze_provider_affiliations_polars(endpoints_lf, top_n=20):
+    """
+    Polars version of analyze_provider_affiliations; the grouping runs
+    multithreaded and only the small result is converted to pandas.
+    """
+    print("--- Starting Provider Affiliation Analysis (Polars) ---")
+    
+    affiliation_groups = endpoints_lf.drop_nulls('Affiliation Legal Business Name').group_by(
+        'Affiliation Legal Business Name'
+    ).agg(
+        pl.col('NPI').drop_nulls().n_unique().alias('NPI_count'),
+        pl.col('Endpoint').drop_nulls().n_unique().alias('Endpoint_count')
+    ).sort('NPI_count', descending=True).collect().to_pandas()
+    
+    print(f"Identified {len(affiliation_groups)} provider organizations.")
+    print("--- Affiliation Analysis Complete ---\n")
+    
+    return affiliation_groups, affiliation_groups.head(top_n).to_dict('records')
+
+
+def with_total_charges(billing_lf):
+    """Adds Total_Charges and normalizes the zip code column on a billing LazyFrame."""
+    return billing_lf.with_columns(
+        (pl.col('Tot_Srvcs') * pl.col('Avg_Sbmtd_Chrg')).alias('Total_Charges'),
+        pl.col('Rndrng_Prvdr_Zip5').str.zfill(5).str.slice(0, 5)
+    )
+
+
+def calculate_market_analysis_polars(billing_lf, provider_name_map):
+    """
+    Polars version of calculate_market_analysis. Runs as one lazy query with a
+    multithreaded groupby and returns the same DataFrame.
+    """
+    print("--- Starting Market Share Analysis (Polars) ---")
+    
+    market_keys = ['Rndrng_Prvdr_Zip5', 'Rndrng_Prvdr_Type']
+    providers = with_total_charges(billing_lf).drop_nulls(market_keys + ['Rndrng_NPI']).group_by(
+        market_keys + ['Rndrng_NPI']
+    ).agg(
+        pl.col('Total_Charges').sum().alias('providerRevenue'),
+        pl.col('Tot_Srvcs').sum().alias('providerServices')
+    ).with_columns(
+        pl.col('providerRevenue').sum().over(market_keys).alias('totalMarketRevenue'),
+        pl.len().over(market_keys).alias('providerCount')
+    ).with_columns(
+        pl.when(pl.col('totalMarketRevenue') > 0)
+        .then(pl.col('providerRevenue') / pl.col('totalMarketRevenue') * 100)
+        .otherwise(0.0)
+        .alias('marketSharePercentage'),
+        pl.col('Rndrng_NPI').replace_strict(
+            provider_name_map, default='Unknown Provider', return_dtype=pl.Utf8
+        ).alias('providerName')
+    ).sort(market_keys + ['Rndrng_NPI']).select(
+        pl.col('Rndrng_Prvdr_Zip5').alias('zipCode'),
+        pl.col('Rndrng_Prvdr_Type').alias('specialty'),
+        'providerName',
+        pl.col('Rndrng_NPI').alias('providerNPI'),
+        'providerRevenue',
+        'providerServices',
+        'marketSharePercentage',
+        'providerCount',
+        'totalMarketRevenue'
+    ).collect()
+    
+    print(f"Analyzed {providers.select(pl.struct('zipCode', 'specialty').n_unique()).item()} markets.")
+    print("--- Market Share Analysis Complete ---\n")
+    return providers.to_pandas()
+
+
 def identify_leakage_opportunities(market_analysis):
     """
     Identifies revenue leakage risks and opportunities from market analysis results.
 
     Args:
-        market_analysis (list): A list of market analysis dictionaries.
+        market_analysis (pd.DataFrame): Market analysis rows from calculate_market_analysis.
 
     Returns:
         list: A list of dictionaries, each describing a specific leakage opportunity.
@@ -169,25 +434,27 @@ def identify_leakage_opportunities(market_analysis):
     leakage_opportunities = []
 
     # High concentration markets are a risk (competitors can poach from the single dominant provider)
-    high_concentration_markets = [m for m in market_analysis if m['marketSharePercentage'] > 80]
-    for market in high_concentration_markets[:15]: # Top 15 risks
+    high_concentration_markets = market_analysis[market_analysis['marketSharePercentage'] > 80]
+    for market in high_concentration_markets.head(15).itertuples(index=False): # Top 15 risks
         leakage_opportunities.append({
             'type': 'High Concentration Risk',
-            'zipCode': market['zipCode'],
-            'specialty': market['specialty'],
-            'description': f"{market['providerName']} has a {market['marketSharePercentage']:.1f}% market share in {market['specialty']} in zip {market['zipCode']}.",
-            'revenue': market['totalMarketRevenue'],
+            'zipCode': market.zipCode,
+            'specialty': market.specialty,
+            'description': f"{market.providerName} has a {market.marketSharePercentage:.1f}% market share in {market.specialty} in zip {market.zipCode}.",
+            'revenue': market.totalMarketRevenue,
         })
 
     # Low concentration (fragmented) markets are an opportunity for growth
-    low_concentration_markets = [m for m in market_analysis if m['marketSharePercentage'] < 25 and m['providerCount'] > 5]
-    for market in low_concentration_markets[:15]: # Top 15 opportunities
+    low_concentration_markets = market_analysis[
+        (market_analysis['marketSharePercentage'] < 25) & (market_analysis['providerCount'] > 5)
+    ]
+    for market in low_concentration_markets.head(15).itertuples(index=False): # Top 15 opportunities
         leakage_opportunities.append({
             'type': 'Market Share Opportunity',
-            'zipCode': market['zipCode'],
-            'specialty': market['specialty'],
-            'description': f"Fragmented market: {market['specialty']} in zip {market['zipCode']} has {market['providerCount']} providers, with the top provider holding only {market['marketSharePercentage']:.1f}% share.",
-            'revenue': market['totalMarketRevenue'],
+            'zipCode': market.zipCode,
+            'specialty': market.specialty,
+            'description': f"Fragmented market: {market.specialty} in zip {market.zipCode} has {market.providerCount} providers, with the top provider holding only {market.marketSharePercentage:.1f}% share.",
+            'revenue': market.totalMarketRevenue,
         })
         
     print(f"Identified {len(leakage_opportunities)} key opportunities and risks.")
@@ -195,6 +462,16 @@ def identify_leakage_opportunities(market_analysis):
     return leakage_opportunities
 
 
+def records_fragment(df):
+    """
+    Serializes df as a JSON array of records with pandas' C encoder and wraps
+    it as an orjson.Fragment, so no per-row dicts are built on the way out.
+    """
+    # Categorical / Arrow-backed string columns are encoded as plain strings
+    df = df.astype({c: object for c in df.columns if not isinstance(df[c].dtype, np.dtype)})
+    return orjson.Fragment(df.to_json(orient='records', double_precision=15))
+
+
 def generate_insights_json(market_analysis, provider_networks, leakage_opportunities, output_file):
     """
     Assembles all analysis results into a final JSON structure and saves it to a file.
@@ -202,8 +479,9 @@ def generate_insights_json(market_analysis, provider_networks, leakage_opportuni
     print("--- Generating Final Insights JSON ---")
     
     # Calculate summary statistics for the dashboard
-    total_revenue_analyzed = sum(m['totalMarketRevenue'] for m in market_analysis)
-    avg_market_share = np.mean([m['marketSharePercentage'] for m in market_analysis]) if market_analysis else 0
+    market_share = market_analysis['marketSharePercentage'].to_numpy()
+    total_revenue_analyzed = float(market_analysis['totalMarketRevenue'].sum())
+    avg_market_share = float(market_share.mean()) if len(market_share) else 0
     
     # Handle provider_networks as list (from updated market analysis)
     if isinstance(provider_networks, list):
@@ -215,13 +493,13 @@ def generate_insights_json(market_analysis, provider_networks, leakage_opportuni
     insights = {
         'summary': {
             'totalMarketsAnalyzed': len(market_analysis),
-            'highConcentrationMarkets': len([m for m in market_analysis if m['marketSharePercentage'] > 80]),
-            'fragmentedMarkets': len([m for m in market_analysis if m['marketSharePercentage'] < 25 and m['providerCount'] > 5]),
+            'highConcentrationMarkets': int((market_share > 80).sum()),
+            'fragmentedMarkets': int(((market_share < 25) & (market_analysis['providerCount'].to_numpy() > 5)).sum()),
             'totalRevenueAnalyzed': total_revenue_analyzed,
             'averageMarketShare': avg_market_share,
             'providerNetworksCount': len(provider_networks_data)
         },
-        'marketAnalysis': market_analysis[:100],  # Top 100 concentrated markets
+        'marketAnalysis': records_fragment(market_analysis.head(100)),  # Top 100 concentrated markets
         'leakageOpportunities': leakage_opportunities,
         'providerNetworks': provider_networks_data
     }
@@ -230,14 +508,48 @@ def generate_insights_json(market_analysis, provider_networks, leakage_opportuni
     save_json_file(insights, output_file)
 
 
+def market_hhi(zip_codes, type_codes, revenue):
+    """
+    Herfindahl-Hirschman Index (sum of squared revenue shares, 0-1) of each
+    row's (zip, specialty) market, returned per row.
+
+    Rows are sorted once by their integer market key so each market is a
+    contiguous run; totals and squared-share sums are then single passes of
+    np.add.reduceat over the run offsets.
+    """
+    if len(revenue) == 0:
+        return np.zeros(0)
+    market_key = zip_codes.astype(np.int64) * (int(type_codes.max()) + 2) + (type_codes.astype(np.int64) + 1)
+    order = np.argsort(market_key, kind='stable')
+    sorted_key = market_key[order]
+    sorted_revenue = revenue[order]
+    
+    offsets = np.concatenate(([0], np.flatnonzero(np.diff(sorted_key)) + 1))
+    run_lengths = np.diff(np.append(offsets, len(sorted_key)))
+    
+    totals = np.repeat(np.add.reduceat(sorted_revenue, offsets), run_lengths)
+    shares = np.divide(sorted_revenue, totals, out=np.zeros_like(sorted_revenue), where=totals > 0)
+    hhi_sorted = np.repeat(np.add.reduceat(shares * shares, offsets), run_lengths)
+    
+    hhi = np.empty_like(hhi_sorted)
+    hhi[order] = hhi_sorted
+    return hhi
+
+
 def create_provider_features(billing_df, nppes_df):
     """
     Engineers a rich feature set for each provider to be used in ML modeling.
     """
     print("--- Starting Advanced Feature Engineering ---")
 
+    # Group on category codes rather than hashing the key strings
+    for col in ['Rndrng_NPI', 'Rndrng_Prvdr_Zip5', 'Rndrng_Prvdr_Type']:
+        if not isinstance(billing_df[col].dtype, pd.CategoricalDtype):
+            billing_df[col] = billing_df[col].astype('category')
+    ensure_c_contiguous(billing_df, ['Total_Charges', 'Tot_Srvcs', 'Tot_Benes', 'Avg_Sbmtd_Chrg'])
+
     # 1. Core Provider Metrics
-    provider_agg = billing_df.groupby('Rndrng_NPI').agg(
+    provider_agg = billing_df.groupby('Rndrng_NPI', sort=False, observed=True).agg(
         total_revenue=('Total_Charges', 'sum'),
         total_services=('Tot_Srvcs', 'sum'),
         unique_patients=('Tot_Benes', 'sum'),
@@ -245,13 +557,17 @@ def create_provider_features(billing_df, nppes_df):
         avg_charge_per_service=('Avg_Sbmtd_Chrg', 'mean'),
         std_dev_charge=('Avg_Sbmtd_Chrg', 'std'),
     ).reset_index()
+    ensure_c_contiguous(provider_agg, provider_agg.columns[1:])
 
     # 2. Temporal Features (Simulated)
     # In a real scenario, you'd use data from different time periods.
-    # Here, we simulate trends using random multipliers.
-    provider_agg['revenue_trend_3m'] = provider_agg['total_revenue'] * np.random.uniform(0.8, 1.2, size=len(provider_agg))
-    provider_agg['revenue_trend_6m'] = provider_agg['total_revenue'] * np.random.uniform(0.7, 1.3, size=len(provider_agg))
-    provider_agg['revenue_trend_12m'] = provider_agg['total_revenue'] * np.random.uniform(0.6, 1.4, size=len(provider_agg))
+    # Here, we simulate trends using random multipliers (3m: 0.8-1.2, 6m: 0.7-1.3, 12m: 0.6-1.4)
+    # drawn as one (n, 3) block and assigned together.
+    rng = np.random.default_rng()
+    trend_multipliers = np.array([0.8, 0.7, 0.6]) + rng.random((len(provider_agg), 3)) * np.array([0.4, 0.6, 0.8])
+    provider_agg[['revenue_trend_3m', 'revenue_trend_6m', 'revenue_trend_12m']] = (
+        provider_agg['total_revenue'].to_numpy()[:, None] * trend_multipliers
+    )
     
     # 3. Geographic and Specialty Features from NPPES
     provider_details = nppes_df[['NPI', 'Provider Business Practice Location Address Postal Code', 'Healthcare Provider Taxonomy Code_1']]
@@ -269,38 +585,63 @@ def create_provider_features(billing_df, nppes_df):
     features_df['zip_code'] = features_df['zip_code'].str.slice(0, 5)
 
     # 4. Market Concentration (Herfindahl-Hirschman Index)
-    market_revenue = billing_df.groupby(['Rndrng_Prvdr_Zip5', 'Rndrng_Prvdr_Type'])['Total_Charges'].sum().reset_index()
-    market_revenue = market_revenue.rename(columns={'Total_Charges': 'market_total_revenue', 'Rndrng_Prvdr_Zip5': 'zip_code', 'Rndrng_Prvdr_Type': 'specialty_code'})
-    
-    provider_market_revenue = billing_df.groupby(['Rndrng_NPI', 'Rndrng_Prvdr_Zip5', 'Rndrng_Prvdr_Type'])['Total_Charges'].sum().reset_index()
-    provider_market_revenue = provider_market_revenue.rename(columns={'Rndrng_Prvdr_Zip5': 'zip_code', 'Rndrng_Prvdr_Type': 'specialty_code', 'Rndrng_NPI': 'Rndrng_NPI_str'})
+    # One provider-by-market groupby; market totals and HHI are derived from it
+    market_keys = ['Rndrng_Prvdr_Zip5', 'Rndrng_Prvdr_Type']
+    provider_market_revenue = billing_df.groupby(
+        ['Rndrng_NPI'] + market_keys, sort=False, observed=True
+    )['Total_Charges'].sum().reset_index()
+    provider_market_revenue['hhi'] = market_hhi(
+        provider_market_revenue['Rndrng_Prvdr_Zip5'].cat.codes.to_numpy(),
+        provider_market_revenue['Rndrng_Prvdr_Type'].cat.codes.to_numpy(),
+        provider_market_revenue['Total_Charges'].to_numpy(dtype=np.float64)
+    )
     
-    # This part is complex, will simplify for now.
-    print("Skipping complex HHI calculation for this version.")
-    features_df['market_concentration'] = np.random.rand(len(features_df)) # Placeholder
+    # Each provider takes the HHI (0-1) of the market where it bills the most
+    primary_market = provider_market_revenue.sort_values('Total_Charges', ascending=False).drop_duplicates('Rndrng_NPI')
+    hhi_by_npi = pd.Series(primary_market['hhi'].to_numpy(), index=primary_market['Rndrng_NPI'].astype(str).to_numpy())
+    features_df['market_concentration'] = features_df['Rndrng_NPI'].map(hhi_by_npi).fillna(0)
 
     # 5. Categorical Encoding
+    # Categorical codes over sorted categories match LabelEncoder's labels.
+    # Missing values (null cells, unmatched NPIs) get their own 'UNKNOWN'
+    # category rather than the -1 code
     for col in ['zip_code', 'specialty_code']:
-        le = LabelEncoder()
-        features_df[f'{col}_encoded'] = le.fit_transform(features_df[col].astype(str))
-
-    # Placeholder for other advanced features
-    features_df['geographic_distance'] = np.random.uniform(1, 100, size=len(features_df))
-    features_df['specialty_alignment_score'] = np.random.rand(len(features_df))
-    features_df['historical_leakage_rate'] = np.random.beta(a=2, b=5, size=len(features_df))
+        features_df[f'{col}_encoded'] = pd.Categorical(features_df[col].fillna('UNKNOWN').astype(str)).codes.astype(np.int32)
+
+    # Placeholder for other advanced features, added in a single concat
+    n = len(features_df)
+    uniform = rng.random((n, 2))
+    placeholders = pd.DataFrame({
+        'geographic_distance': 1 + uniform[:, 0] * 99,
+        'specialty_alignment_score': uniform[:, 1],
+        'historical_leakage_rate': rng.beta(a=2, b=5, size=n)
+    }, index=features_df.index)
+    features_df = pd.concat([features_df, placeholders], axis=1)
     
     print(f"Successfully engineered {len(features_df.columns)} features for {len(features_df)} providers.")
     print("--- Advanced Feature Engineering Complete ---\n")
+    # Arrow-backed string columns can't take a numeric fill value
+    features_df = features_df.astype({'zip_code': object, 'specialty_code': object})
     return features_df.fillna(0)
 
 
 def save_json_file(data, file_path):
     """
     Saves data to a JSON file, creating directories if they don't exist.
+    Numpy scalars and arrays are serialized natively by orjson.
     """
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, 'w') as f:
-        json.dump(data, f, indent=4)
+    with open(file_path, 'wb') as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_INDENT_2))
+    print(f"Successfully saved data to {file_path}")
+
+
+def save_parquet_file(df, file_path):
+    """
+    Saves a DataFrame to a Snappy-compressed Parquet file, creating directories if they don't exist.
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    df.to_parquet(file_path, engine='pyarrow', compression='snappy', index=False)
     print(f"Successfully saved data to {file_path}")
 
 
@@ -317,39 +658,68 @@ def engineer_features(referral_df, provider_df, claims_df):
     return features
 
 
-def main():
+def main(engine='pandas'):
     """
     Main function to orchestrate the entire data pipeline.
+
+    Args:
+        engine (str): 'pandas' (default) or 'polars'. The Polars engine scans the
+            Medicare and endpoint files lazily and runs the market and affiliation
+            stages as multithreaded Polars queries; output is identical in shape.
     """
-    # 1. Load Data
-    nppes_df, physician_df, billing_df, endpoints_df = load_datasets()
+    if engine == 'polars' and pl is None:
+        raise ImportError("The polars engine requires the 'polars' package")
+    
+    # 1. Load Data (the provider name map is built while the NPI file streams)
+    if engine == 'polars':
+        provider_name_map, nppes_df = load_nppes()
+        billing_lf, endpoints_lf = scan_datasets()
+    else:
+        provider_name_map, nppes_df, billing_df, endpoints_df = load_datasets()
     
-    # 2. Process and Clean Data
-    provider_name_map = build_provider_name_map(nppes_df)
+    # 2. Run Analyses
+    if engine == 'polars':
+        market_analysis = calculate_market_analysis_polars(billing_lf, provider_name_map)
+        provider_networks, top_networks = analyze_provider_affiliations_polars(endpoints_lf)
+        # Feature engineering below works on pandas: collect only the columns
+        # the pandas engine reads and normalize them the same way
+        billing_df = prepare_billing_df(billing_lf.select(MEDICARE_COLUMNS).collect().to_pandas())
+    else:
+        market_analysis = calculate_market_analysis(billing_df, provider_name_map)
+        provider_networks, top_networks = analyze_provider_affiliations(endpoints_df)
+        del endpoints_df
     
-    # 3. Run Analyses
-    market_analysis = calculate_market_analysis(billing_df, provider_name_map)
-    provider_networks = analyze_provider_affiliations(endpoints_df)
+    # Persist the name map and full market analysis so downstream scripts can
+    # read them with column projection instead of re-running the pipeline
+    save_parquet_file(
+        pd.DataFrame({'NPI': list(provider_name_map.keys()), 'providerName': list(provider_name_map.values())}),
+        OUTPUT_PROVIDER_NAMES_PARQUET
+    )
+    save_parquet_file(market_analysis, OUTPUT_MARKET_ANALYSIS_PARQUET)
+    del provider_name_map
+    gc.collect()
     leakage_opportunities = identify_leakage_opportunities(market_analysis)
     
-    # 4. Generate and Save Final Output
+    # 3. Generate and Save Final Output
     generate_insights_json(
         market_analysis,
-        provider_networks.to_dict(orient='records'),
+        top_networks,
         leakage_opportunities,
         OUTPUT_INSIGHTS_FILE
     )
+    del market_analysis, provider_networks, top_networks, leakage_opportunities
+    gc.collect()
     
     # --- Engineer and Save Advanced ML Features ---
-    # Re-calculate total charges on the full dataset if needed
-    if 'Total_Charges' not in billing_df.columns:
-        billing_df['Total_Charges'] = billing_df['Tot_Srvcs'] * billing_df['Avg_Sbmtd_Chrg']
-        
     provider_features_df = create_provider_features(billing_df, nppes_df)
     
-    # Save the features to a file for the ML model to use
+    # Save the features for the ML model (Parquet) and the S3 upload (JSON)
+    save_parquet_file(provider_features_df, OUTPUT_FEATURES_PARQUET)
     save_json_file(provider_features_df.to_dict(orient='records'), OUTPUT_FEATURES_FILE)
 
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="ReferralGuard data pipeline")
+    parser.add_argument('--engine', choices=['pandas', 'polars'], default='pandas',
+                        help="Dataframe engine for the market and affiliation stages")
+    main(engine=parser.parse_args().engine) 
\ No newline at end of file
@@ -1,11 +1,19 @@
 import numpy as np
 # TODO: import pandas, scipy, and other financial/statistical libraries
 
-def monte_carlo_revenue_simulation(params, n_sim=1000):
+# Shared Generator; faster than the legacy np.random global state
+rng = np.random.default_rng()
+
+def monte_carlo_revenue_simulation(params, n_sim=1000, out=None):
     # TODO: Model uncertainty in referral patterns
     # TODO: Generate probability distributions, calculate VaR
-    results = np.random.normal(loc=100000, scale=20000, size=n_sim)
-    return results
+    # Draws fill `out` (float32 or float64, length n_sim) in place when given
+    if out is None:
+        out = np.empty(n_sim, dtype=np.float64)
+    rng.standard_normal(out=out, dtype=out.dtype)
+    out *= params.get('sigma', 20000)
+    out += params.get('mu', 100000)
+    return out
 
 # Cohort analysis
 # TODO: Track provider loyalty, LTV, early warning signals
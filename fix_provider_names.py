@@ -6,25 +6,44 @@ and replacing "Unknown Provider" with better placeholders.
 
 import json
 import pandas as pd
+import numpy as np
 import os
 from typing import Dict, List, Any
 
+NPI_FILE = 'data/npidata_pfile_20050523-20250608.csv'
+NPI_PARQUET_CACHE = 'outputs/npi_names.parquet'
+NPI_COLUMNS = [
+    'NPI', 
+    'Provider Last Name (Legal Name)',
+    'Provider First Name',
+    'Provider Organization Name (Legal Business Name)',
+    'Provider Business Practice Location Address City',
+    'Provider Business Practice Location Address State'
+]
+
 def load_npi_data():
     """Load NPI data to build provider name lookup."""
     try:
+        # Reuse the Parquet snapshot while it is newer than the source CSV
+        if os.path.exists(NPI_PARQUET_CACHE) and (
+            not os.path.exists(NPI_FILE) or
+            os.path.getmtime(NPI_PARQUET_CACHE) >= os.path.getmtime(NPI_FILE)
+        ):
+            print(f"Loading NPI data from {NPI_PARQUET_CACHE}...")
+            return pd.read_parquet(NPI_PARQUET_CACHE, columns=NPI_COLUMNS)
+        
         # Try to load from S3 first, then local
-        npi_file = 'data/npidata_pfile_20050523-20250608.csv'
-        if os.path.exists(npi_file):
-            print(f"Loading NPI data from {npi_file}...")
+        if os.path.exists(NPI_FILE):
+            print(f"Loading NPI data from {NPI_FILE}...")
             # Load only essential columns to save memory
-            npi_df = pd.read_csv(npi_file, usecols=[
-                'NPI', 
-                'Provider Last Name (Legal Name)',
-                'Provider First Name',
-                'Provider Organization Name (Legal Business Name)',
-                'Provider Business Practice Location Address City',
-                'Provider Business Practice Location Address State'
-            ], nrows=1000000)  # Load first 1M records for lookup
+            npi_df = pd.read_csv(NPI_FILE, usecols=NPI_COLUMNS, dtype=str, nrows=1000000)  # Load first 1M records for lookup
+            
+            # Snapshot the projected columns so later runs skip the CSV parse
+            try:
+                os.makedirs(os.path.dirname(NPI_PARQUET_CACHE), exist_ok=True)
+                npi_df.to_parquet(NPI_PARQUET_CACHE, engine='pyarrow', compression='snappy', index=False)
+            except Exception as e:
+                print(f"Could not cache NPI data to {NPI_PARQUET_CACHE}: {e}")
             return npi_df
         else:
             print("NPI file not found, will use fallback naming")
@@ -38,23 +57,28 @@ def build_provider_lookup(npi_df):
     if npi_df is None:
         return {}
     
-    provider_lookup = {}
-    for _, row in npi_df.iterrows():
-        npi = str(row['NPI'])
-        
-        # Try individual provider name first
-        last_name = str(row.get('Provider Last Name (Legal Name)', '')).strip()
-        first_name = str(row.get('Provider First Name', '')).strip()
-        
-        if last_name and first_name and last_name != 'nan' and first_name != 'nan':
-            provider_lookup[npi] = f"{last_name}, {first_name}"
-        elif last_name and last_name != 'nan':
-            provider_lookup[npi] = last_name
-        else:
-            # Fall back to organization name
-            org_name = str(row.get('Provider Organization Name (Legal Business Name)', '')).strip()
-            if org_name and org_name != 'nan':
-                provider_lookup[npi] = org_name
+    def clean(col):
+        # Missing values are masked by fillna before any string conversion
+        return npi_df[col].fillna('').astype(str).str.strip()
+    
+    npi = npi_df['NPI'].astype(str).to_numpy()
+    last_name = clean('Provider Last Name (Legal Name)')
+    first_name = clean('Provider First Name')
+    org_name = clean('Provider Organization Name (Legal Business Name)')
+    
+    # Individual name first ("Last, First", or just the last name),
+    # falling back to the organization name
+    has_last = (last_name != '').to_numpy()
+    has_first = (first_name != '').to_numpy()
+    names = np.where(
+        has_last & has_first,
+        last_name.str.cat(first_name, sep=', ').to_numpy(),
+        np.where(has_last, last_name.to_numpy(), org_name.to_numpy())
+    )
+    
+    # Providers with no usable name are left out of the lookup
+    has_name = names != ''
+    provider_lookup = dict(zip(npi[has_name], names[has_name]))
     
     print(f"Built lookup for {len(provider_lookup)} providers")
     return provider_lookup
@@ -64,28 +88,32 @@ def fix_provider_names(real_insights: Dict[str, Any], provider_lookup: Dict[str,
     if 'marketAnalysis' not in real_insights:
         return real_insights
     
-    fixed_count = 0
-    total_count = 0
+    markets = pd.DataFrame(real_insights['marketAnalysis'])
+    total_count = len(markets)
     
-    for market in real_insights['marketAnalysis']:
-        total_count += 1
-        npi = str(market.get('topProviderNPI', ''))
-        current_name = market.get('topProviderName', '')
-        
-        # Skip if already has a good name
-        if current_name and current_name != 'Unknown Provider' and current_name != 'nan, nan':
-            continue
-        
-        # Try to find the provider name
-        if npi in provider_lookup:
-            market['topProviderName'] = provider_lookup[npi]
-            fixed_count += 1
-        else:
-            # Create a better placeholder
-            specialty = market.get('specialty', 'Unknown Specialty')
-            zip_code = market.get('zipCode', 'Unknown ZIP')
-            market['topProviderName'] = f"Provider NPI:{npi} ({specialty})"
-            fixed_count += 1
+    def column(name, default):
+        # Missing keys (or a missing column) fall back to the default, as dict.get did
+        if name not in markets:
+            return pd.Series(default, index=markets.index, dtype=object)
+        return markets[name].where(markets[name].notna(), default)
+    
+    npi = column('topProviderNPI', '').astype(str)
+    current_name = column('topProviderName', '')
+    
+    # Skip entries that already have a good name
+    needs_fix = ~(
+        current_name.astype(bool) &
+        (current_name != 'Unknown Provider') &
+        (current_name != 'nan, nan')
+    )
+    
+    # Look the NPI up, or create a better placeholder
+    placeholder = 'Provider NPI:' + npi + ' (' + column('specialty', 'Unknown Specialty').astype(str) + ')'
+    fixed_names = npi.map(pd.Series(provider_lookup, dtype=object)).fillna(placeholder)
+    
+    for i, name in zip(np.flatnonzero(needs_fix.to_numpy()), fixed_names[needs_fix].tolist()):
+        real_insights['marketAnalysis'][i]['topProviderName'] = name
+    fixed_count = int(needs_fix.sum())
     
     print(f"Fixed {fixed_count} out of {total_count} provider names")
     return real_insights
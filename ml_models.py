@@ -1,13 +1,13 @@
 import pandas as pd
 import numpy as np
 import json
+import heapq
 import logging
 from datetime import datetime
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, roc_auc_score
-from sklearn.preprocessing import LabelEncoder
 import xgboost as xgb
-import pickle
+import joblib
 import warnings
 
 # Configure logging
@@ -52,49 +52,54 @@ def create_features_from_market_data(df):
     """Create ML features from market analysis data"""
     logger.info("Creating features from market analysis data...")
     
-    features = df.copy()
+    market_share = df['marketSharePercentage']
+    total_revenue = df['totalMarketRevenue']
+    provider_count = df['providerCount']
+    new_cols = {}
     
     # 1. Basic market features
-    features['market_share_log'] = np.log(features['marketSharePercentage'] + 1)
-    features['total_revenue_log'] = np.log(features['totalMarketRevenue'] + 1)
-    features['provider_count_log'] = np.log(features['providerCount'] + 1)
+    new_cols['market_share_log'] = np.log1p(market_share)
+    new_cols['total_revenue_log'] = np.log1p(total_revenue)
+    new_cols['provider_count_log'] = np.log1p(provider_count)
     
     # 2. Risk indicators
-    features['is_high_concentration'] = (features['marketSharePercentage'] > 80).astype(int)
-    features['is_fragmented'] = (features['marketSharePercentage'] < 25).astype(int)
-    features['is_medium_risk'] = ((features['marketSharePercentage'] >= 25) & (features['marketSharePercentage'] <= 80)).astype(int)
+    new_cols['is_high_concentration'] = (market_share > 80).astype(np.int8)
+    new_cols['is_fragmented'] = (market_share < 25).astype(np.int8)
+    new_cols['is_medium_risk'] = ((market_share >= 25) & (market_share <= 80)).astype(np.int8)
     
     # 3. Revenue efficiency
-    features['revenue_per_provider'] = features['totalMarketRevenue'] / features['providerCount']
-    features['revenue_per_provider_log'] = np.log(features['revenue_per_provider'] + 1)
+    new_cols['revenue_per_provider'] = total_revenue / provider_count
+    new_cols['revenue_per_provider_log'] = np.log1p(new_cols['revenue_per_provider'])
     
     # 4. Market dynamics
-    features['market_competition_score'] = 1 / (features['marketSharePercentage'] + 1)  # Higher score = more competition
-    features['market_efficiency'] = features['totalMarketRevenue'] / (features['providerCount'] ** 0.5)  # Revenue per sqrt(providers)
+    new_cols['market_competition_score'] = 1 / (market_share + 1)  # Higher score = more competition
+    new_cols['market_efficiency'] = total_revenue / (provider_count ** 0.5)  # Revenue per sqrt(providers)
     
-    # 5. Specialty encoding
-    le = LabelEncoder()
-    features['specialty_encoded'] = le.fit_transform(features['specialty'].fillna('Unknown'))
+    # 5. Specialty encoding (sorted category codes, as LabelEncoder assigned them)
+    new_cols['specialty_encoded'] = pd.Categorical(df['specialty'].fillna('Unknown')).codes
     
     # 6. Geographic features (from zip code)
-    features['zip_region'] = features['zipCode'].str[:2].astype(str)
-    features['zip_region_encoded'] = le.fit_transform(features['zip_region'].fillna('00'))
+    new_cols['zip_region'] = df['zipCode'].str[:2].astype(str)
+    new_cols['zip_region_encoded'] = pd.Categorical(new_cols['zip_region'].fillna('00')).codes
     
     # 7. Provider name features
-    features['has_provider_name'] = (features['topProviderName'] != 'Unknown Provider').astype(int)
-    features['provider_name_length'] = features['topProviderName'].str.len()
+    new_cols['has_provider_name'] = (df['topProviderName'] != 'Unknown Provider').astype(np.int8)
+    new_cols['provider_name_length'] = df['topProviderName'].str.len()
     
     # 8. Risk score (composite)
-    features['risk_score'] = (
-        features['market_share_log'] * 0.3 +
-        features['market_competition_score'] * 0.2 +
-        features['revenue_per_provider_log'] * 0.2 +
-        features['provider_count_log'] * 0.15 +
-        features['has_provider_name'] * 0.15
+    new_cols['risk_score'] = (
+        new_cols['market_share_log'] * 0.3 +
+        new_cols['market_competition_score'] * 0.2 +
+        new_cols['revenue_per_provider_log'] * 0.2 +
+        new_cols['provider_count_log'] * 0.15 +
+        new_cols['has_provider_name'] * 0.15
     )
-        
-        # Select final features for ML
-        ml_features = [
+    
+    # Add every derived column in a single assign
+    features = df.assign(**new_cols)
+    
+    # Select final features for ML
+    ml_features = [
         'market_share_log', 'total_revenue_log', 'provider_count_log',
         'is_high_concentration', 'is_fragmented', 'is_medium_risk',
         'revenue_per_provider_log', 'market_competition_score', 'market_efficiency',
@@ -102,9 +107,9 @@ def create_features_from_market_data(df):
         'provider_name_length', 'risk_score'
     ]
     
-        # Remove rows with missing values
-        features = features.dropna(subset=ml_features)
-        
+    # Remove rows with missing values
+    features = features.dropna(subset=ml_features)
+    
     logger.info(f"Created {len(ml_features)} features for {len(features)} markets")
     return features[ml_features + ['is_high_risk']]
 
@@ -118,55 +123,56 @@ def train_xgboost_model(features_df):
     
     # Prepare features and target
     feature_cols = [col for col in features_df.columns if col != 'is_high_risk']
-    X = features_df[feature_cols]
+    X = features_df[feature_cols].astype(np.float32)
     y = features_df['is_high_risk']
     
     logger.info(f"Training on {len(X)} samples with {len(X.columns)} features")
     logger.info(f"Target distribution: {y.value_counts().to_dict()}")
-        
-        # Split data
+    
+    # Split data
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
-        
-        # Train XGBoost model
-        model = xgb.XGBClassifier(
-            n_estimators=100,
-            max_depth=6,
-            learning_rate=0.1,
-            random_state=42,
+    
+    # Train XGBoost model
+    model = xgb.XGBClassifier(
+        n_estimators=100,
+        max_depth=6,
+        learning_rate=0.1,
+        tree_method='hist',  # Quantile histograms instead of exact split search
+        n_jobs=-1,
+        random_state=42,
         eval_metric='logloss',
         scale_pos_weight=1  # Adjust if class imbalance
-        )
-        
-        model.fit(X_train, y_train)
-        
-        # Make predictions
-        y_pred = model.predict(X_test)
-        y_pred_proba = model.predict_proba(X_test)[:, 1]
-        
-        # Calculate metrics
-        auc_score = roc_auc_score(y_test, y_pred_proba)
-        accuracy = (y_pred == y_test).mean()
-        
-        # Feature importance
-        feature_importance = dict(zip(X.columns, model.feature_importances_))
-        
+    )
+    
+    model.fit(X_train, y_train)
+    
+    # Make predictions
+    y_pred = model.predict(X_test)
+    y_pred_proba = model.predict_proba(X_test)[:, 1]
+    
+    # Calculate metrics
+    auc_score = roc_auc_score(y_test, y_pred_proba)
+    accuracy = (y_pred == y_test).mean()
+    
+    # Feature importance
+    feature_importance = dict(zip(X.columns, model.feature_importances_))
+    
     logger.info(f"XGBoost model trained successfully!")
     logger.info(f"AUC: {auc_score:.4f}, Accuracy: {accuracy:.4f}")
-    logger.info(f"Top 5 features: {sorted(feature_importance.items(), key=lambda x: x[1], reverse=True)[:5]}")
+    logger.info(f"Top 5 features: {heapq.nlargest(5, feature_importance.items(), key=lambda x: x[1])}")
     
     return model, feature_importance, {
-            'auc_score': auc_score,
-            'accuracy': accuracy,
-            'classification_report': classification_report(y_test, y_pred)
-        }
-        
+        'auc_score': auc_score,
+        'accuracy': accuracy,
+        'classification_report': classification_report(y_test, y_pred)
+    }
+
 def save_model(model, file_path):
-    """Save the trained model to a pickle file"""
+    """Save the trained model with joblib (uncompressed so it can be memory-mapped)"""
     import os
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
     
-    with open(file_path, 'wb') as f:
-        pickle.dump(model, f)
+    joblib.dump(model, file_path, compress=0)
     
     logger.info(f"Model saved to {file_path}")
 
@@ -1,6 +1,7 @@
 import json
-import csv
 import os
+import ijson
+import pandas as pd
 
 INSIGHTS_PATH = 'outputs/real_insights.json'
 NPI_MAP_PATH = 'data/npi_name_map.json'
@@ -10,30 +11,26 @@ REPORT_PATH = 'outputs/missing_provider_names_report.csv'
 with open(INSIGHTS_PATH, 'r') as f:
     insights = json.load(f)
 
-# Load NPI name map
-with open(NPI_MAP_PATH, 'r') as f:
-    npi_map = json.load(f)
-
-missing = []
-for rec in insights.get('marketAnalysis', []):
-    npi = rec.get('providerNPI')
-    specialty = rec.get('specialty', '')
-    zip_code = rec.get('zipCode', '')
-    provider_name = rec.get('providerName', '')
-    revenue = rec.get('providerRevenue', 0)
-    if not npi or npi not in npi_map:
-        missing.append({
-            'providerNPI': npi or '',
-            'providerName': provider_name,
-            'specialty': specialty,
-            'zipCode': zip_code,
-            'providerRevenue': revenue
-        })
-
-with open(REPORT_PATH, 'w', newline='') as f:
-    writer = csv.DictWriter(f, fieldnames=['providerNPI', 'providerName', 'specialty', 'zipCode', 'providerRevenue'])
-    writer.writeheader()
-    for row in missing:
-        writer.writerow(row)
-
-print(f"Found {len(missing)} providers with missing or unmatched NPIs. Report written to {REPORT_PATH}") 
\ No newline at end of file
+REPORT_COLUMNS = ['providerNPI', 'providerName', 'specialty', 'zipCode', 'providerRevenue']
+
+# Flatten the market analysis records once into columns
+market = pd.json_normalize(insights.get('marketAnalysis', [])).reindex(columns=REPORT_COLUMNS)
+market = market.fillna({'providerNPI': '', 'providerName': '', 'specialty': '', 'zipCode': '', 'providerRevenue': 0})
+
+# NPIs referenced by the insights
+used_npis = frozenset(market['providerNPI'][market['providerNPI'] != ''])
+
+# Stream the NPI name map, keeping only the NPIs we need and stopping once all are found
+npi_map = {}
+with open(NPI_MAP_PATH, 'rb') as f:
+    for npi, name in ijson.kvitems(f, ''):
+        if npi in used_npis:
+            npi_map[npi] = name
+            if len(npi_map) == len(used_npis):
+                break
+
+# Providers with no NPI, or one the name map doesn't know
+missing = market[~market['providerNPI'].isin(list(npi_map))]
+missing.to_csv(REPORT_PATH, index=False)
+
+print(f"Found {len(missing)} providers with missing or unmatched NPIs. Report written to {REPORT_PATH}")
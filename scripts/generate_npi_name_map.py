@@ -1,5 +1,5 @@
 import csv
-import json
+import orjson
 
 NPI_CSV = 'data/npidata_pfile_20050523-20250608.csv'
 OUTPUT_JSON = 'data/npi_name_map.json'
@@ -40,7 +40,7 @@ with open(NPI_CSV, 'r') as f:
         if npi and name:
             npi_map[npi] = name
 
-with open(OUTPUT_JSON, 'w') as f:
-    json.dump(npi_map, f)
+with open(OUTPUT_JSON, 'wb') as f:
+    f.write(orjson.dumps(npi_map))
 
 print(f"Wrote {len(npi_map)} NPI name mappings to {OUTPUT_JSON}") 
\ No newline at end of file
@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 import json
+import heapq
 import logging
 from datetime import datetime
 from sklearn.model_selection import train_test_split
@@ -274,7 +275,7 @@ def train_competitive_models(features_df):
     logger.info(f"Logistic Regression - AUC: {auc_lr:.4f}, Accuracy: {accuracy_lr:.4f}")
     
     # Show top features
-    top_xgb_features = sorted(feature_importance['xgboost'].items(), key=lambda x: x[1], reverse=True)[:5]
+    top_xgb_features = heapq.nlargest(5, feature_importance['xgboost'].items(), key=lambda x: x[1])
     logger.info(f"Top 5 XGBoost features: {top_xgb_features}")
     
     return models, feature_importance, metrics
@@ -340,7 +341,7 @@ def test_competitive_predictions(models, features_df):
     # Show feature importance
     feature_importance = dict(zip(feature_cols, model.feature_importances_))
     logger.info("Top 5 most important competitive features:")
-    top_features = sorted(feature_importance.items(), key=lambda x: x[1], reverse=True)[:5]
+    top_features = heapq.nlargest(5, feature_importance.items(), key=lambda x: x[1])
     for feature, importance in top_features:
         logger.info(f"  {feature}: {importance:.4f}")
 
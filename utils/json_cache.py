@@ -0,0 +1,21 @@
+import os
+from typing import Any, Dict, Tuple
+import orjson
+
+# Parsed JSON documents keyed by (absolute path, mtime in ns)
+_CACHE: Dict[Tuple[str, int], Any] = {}
+
+def load_json_cached(path: str) -> Any:
+    """Parse a JSON file with orjson, reusing the result until the file changes"""
+    path = os.path.abspath(path)
+    key = (path, os.stat(path).st_mtime_ns)
+    data = _CACHE.get(key)
+    if data is None:
+        with open(path, 'rb') as f:
+            data = orjson.loads(f.read())
+        
+        # Drop entries for older versions of the same file
+        for stale in [k for k in _CACHE if k[0] == path]:
+            del _CACHE[stale]
+        _CACHE[key] = data
+    return data